@@ -1,14 +1,158 @@
 import base64
+import binascii
+import os
+from io import BytesIO
 
-from django.core.files.base import ContentFile
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.core.exceptions import ValidationError
+from django.core.files.uploadedfile import (InMemoryUploadedFile,
+                                            TemporaryUploadedFile,
+                                            UploadedFile)
+from PIL import Image
 from rest_framework import serializers
 
+from recipes.models import ImageUpload
+
+BASE64_MARKER = ';base64,'
+CHUNK_SIZE = 64 * 1024
+WHITESPACE = ' \t\n\r\v\f'
+STRIP_WHITESPACE = str.maketrans('', '', WHITESPACE)
+UPLOAD_PREFIX = 'upload:'
+
+
+class StoredUpload(UploadedFile):
+    """Файл завершенного сеанса загрузки.
+    Путь к нему позволяет хранилищу переместить файл, а не копировать."""
+
+    def __init__(self, upload):
+        super().__init__(
+            open(upload.path, 'rb'), upload.name, None, upload.size)
+        self.path = upload.path
+
+    def temporary_file_path(self):
+        return self.path
+
 
 class Base64ImageField(serializers.ImageField):
+    """Изображение в формате data URI или токен загрузки по частям.
+    Данные декодируются частями в загружаемый файл: небольшой
+    в памяти, крупный - во временном файле на диске. Размер проверяется
+    до декодирования, формат и число пикселей - по заголовку файла.
+    Переносы строк и пробелы внутри base64 допускаются."""
+
+    default_error_messages = {
+        'invalid_data_uri': 'Некорректный data URI изображения.',
+        'invalid_upload': 'Загрузка не найдена или не завершена.',
+        'too_large': ('Размер изображения не должен превышать '
+                      '{max_size} байт.'),
+        'invalid_format': 'Допустимые форматы изображения: {formats}.',
+        'too_many_pixels': ('Изображение не должно быть больше '
+                            '{max_pixels} пикселей.'),
+    }
+
     def to_internal_value(self, data):
         if isinstance(data, str) and data.startswith('data:image'):
-            format, imgstr = data.split(';base64,')
-            ext = format.split('/')[-1]
-            data = ContentFile(base64.b64decode(imgstr), name='temp.' + ext)
-
+            data = self.decode(data)
+        elif isinstance(data, str) and data.startswith(UPLOAD_PREFIX):
+            data = self.open_upload(data[len(UPLOAD_PREFIX):])
         return super().to_internal_value(data)
+
+    def open_upload(self, token):
+        try:
+            upload = ImageUpload.objects.filter(
+                token=token,
+                user=self.context['request'].user.id,
+                completed=True,
+            ).first()
+        except ValidationError:
+            upload = None
+        if upload is None or not os.path.exists(upload.path):
+            self.fail('invalid_upload')
+        return StoredUpload(upload)
+
+    def decode(self, data):
+        marker = data.find(BASE64_MARKER, 0, 100)
+        if marker == -1:
+            self.fail('invalid_data_uri')
+        content_type = data[len('data:'):marker]
+        start = marker + len(BASE64_MARKER)
+        spaces = sum(data.count(char, start) for char in WHITESPACE)
+        size = (len(data) - start - spaces) // 4 * 3
+        max_size = settings.IMAGE_UPLOAD_MAX_SIZE
+        if size > max_size:
+            self.fail('too_large', max_size=max_size)
+        if size > settings.FILE_UPLOAD_MAX_MEMORY_SIZE:
+            upload = TemporaryUploadedFile(
+                'image', content_type, 0, None)
+        else:
+            upload = InMemoryUploadedFile(
+                BytesIO(), None, 'image', content_type, 0, None)
+        try:
+            # Без пробелов часть может оказаться не кратной 4 символам:
+            # остаток переносится в начало следующей части.
+            rest = ''
+            for offset in range(start, len(data), CHUNK_SIZE):
+                chunk = rest + data[
+                    offset:offset + CHUNK_SIZE].translate(STRIP_WHITESPACE)
+                aligned = len(chunk) // 4 * 4
+                upload.file.write(
+                    base64.b64decode(chunk[:aligned], validate=True))
+                rest = chunk[aligned:]
+            if rest:
+                raise binascii.Error('Incorrect padding')
+        except binascii.Error:
+            upload.close()
+            self.fail('invalid_data_uri')
+        upload.size = upload.file.tell()
+        upload.name = f'image.{self.check_header(upload)}'
+        upload.seek(0)
+        return upload
+
+    def check_header(self, upload):
+        """Формат и размеры по заголовку, без декодирования пикселей."""
+        upload.seek(0)
+        formats = settings.IMAGE_UPLOAD_FORMATS
+        max_pixels = settings.IMAGE_UPLOAD_MAX_PIXELS
+        try:
+            image = Image.open(upload)
+        except Image.DecompressionBombError:
+            upload.close()
+            self.fail('too_many_pixels', max_pixels=max_pixels)
+        except OSError:
+            upload.close()
+            self.fail('invalid_image')
+        if image.format not in formats:
+            upload.close()
+            self.fail('invalid_format', formats=', '.join(formats))
+        if image.width * image.height > max_pixels:
+            upload.close()
+            self.fail('too_many_pixels', max_pixels=max_pixels)
+        return image.format.lower()
+
+
+class ImageVariantsField(serializers.Field):
+    """Ссылки на уменьшенные копии картинки рецепта.
+    Пока копии новой картинки не построены, отдается пустой словарь."""
+
+    def __init__(self, **kwargs):
+        kwargs['source'] = '*'
+        kwargs['read_only'] = True
+        super().__init__(**kwargs)
+
+    def to_representation(self, recipe):
+        variants = recipe.image_variants
+        if not recipe.image or variants.get('source') != recipe.image.name:
+            return {}
+        request = self.context.get('request')
+        urls = {}
+        for size, files in variants.items():
+            if size == 'source':
+                continue
+            urls[size] = {}
+            for extension, name in files.items():
+                url = default_storage.url(name)
+                if request is not None:
+                    url = request.build_absolute_uri(url)
+                urls[size][extension] = url
+        return urls
@@ -1,6 +1,7 @@
 import django_filters as filters
 from distutils.util import strtobool
 
+from django.db.models import Exists, OuterRef
 from django_filters import rest_framework
 
 from recipes import models
@@ -38,30 +39,23 @@ class RecipeFilter(rest_framework.FilterSet):
         method='is_in_shopping_cart_method'
     )
 
-    def is_favorited_method(self, queryset, name, value):
-        if self.request.user.is_anonymous:
-            return models.Recipe.objects.none()
-
-        favorites = models.Favorite.objects.filter(user=self.request.user)
-        recipes = [item.recipe.id for item in favorites]
-        new_queryset = queryset.filter(id__in=recipes)
+    def filter_by_user_relation(self, queryset, model, value):
+        """Отбирает рецепты, связанные (или не связанные)
+        с текущим пользователем через модель `model`."""
+        user = self.request.user
+        if user.is_anonymous:
+            return queryset.none() if strtobool(value) else queryset
+        related = Exists(
+            model.objects.filter(user=user, recipe=OuterRef('pk')))
+        return queryset.filter(related if strtobool(value) else ~related)
 
-        if not strtobool(value):
-            return queryset.difference(new_queryset)
-        return queryset.filter(id__in=recipes)
+    def is_favorited_method(self, queryset, name, value):
+        return self.filter_by_user_relation(
+            queryset, models.Favorite, value)
 
     def is_in_shopping_cart_method(self, queryset, name, value):
-        if self.request.user.is_anonymous:
-            return models.Recipe.objects.none()
-
-        shopping_cart = models.ShoppingCart.objects.filter(
-            user=self.request.user)
-        recipes = [item.recipe.id for item in shopping_cart]
-        new_queryset = queryset.filter(id__in=recipes)
-
-        if not strtobool(value):
-            return queryset.difference(new_queryset)
-        return queryset.filter(id__in=recipes)
+        return self.filter_by_user_relation(
+            queryset, models.ShoppingCart, value)
 
     class Meta:
         model = models.Recipe
@@ -0,0 +1,203 @@
+import hashlib
+import struct
+from functools import lru_cache
+from pathlib import Path
+
+# Таблицы, нужные PDF-просмотрщику для шрифта с кодировкой Identity:
+# символы уже переведены в номера глифов, cmap и GSUB не нужны.
+SUBSET_TABLES = (b'cvt ', b'fpgm', b'glyf', b'head', b'hhea', b'hmtx',
+                 b'loca', b'maxp', b'prep')
+
+ARG_1_AND_2_ARE_WORDS = 0x0001
+WE_HAVE_A_SCALE = 0x0008
+MORE_COMPONENTS = 0x0020
+WE_HAVE_AN_X_AND_Y_SCALE = 0x0040
+WE_HAVE_A_TWO_BY_TWO = 0x0080
+
+
+def checksum(data):
+    data += b'\0' * (-len(data) % 4)
+    return sum(struct.unpack(f'>{len(data) // 4}I', data)) & 0xFFFFFFFF
+
+
+class TrueTypeFont:
+    """Шрифт TrueType для встраивания в PDF: номера глифов
+    символов, ширины и подмножество файла с нужными глифами."""
+
+    def __init__(self, path):
+        self.name = ''.join(
+            char for char in Path(path).stem if char.isalnum())
+        self.data = Path(path).read_bytes()
+        count = struct.unpack_from('>H', self.data, 4)[0]
+        self.tables = {}
+        for number in range(count):
+            tag, _, offset, length = struct.unpack_from(
+                '>4sIII', self.data, 12 + 16 * number)
+            self.tables[tag] = (offset, length)
+        head = self.table(b'head')
+        self.units = struct.unpack_from('>H', head, 18)[0]
+        self.bbox = struct.unpack_from('>4h', head, 36)
+        long_loca = struct.unpack_from('>h', head, 50)[0]
+        hhea = self.table(b'hhea')
+        self.ascent, self.descent = struct.unpack_from('>2h', hhea, 4)
+        metrics = struct.unpack_from('>H', hhea, 34)[0]
+        glyphs = struct.unpack_from('>H', self.table(b'maxp'), 4)[0]
+        advances = struct.unpack_from(
+            f'>{metrics * 2}H', self.table(b'hmtx'))[::2]
+        self.advances = advances + advances[-1:] * (glyphs - metrics)
+        loca = self.table(b'loca')
+        if long_loca:
+            self.loca = struct.unpack_from(f'>{glyphs + 1}I', loca)
+        else:
+            self.loca = [offset * 2 for offset in struct.unpack_from(
+                f'>{glyphs + 1}H', loca)]
+        self.cmap = self.read_cmap()
+
+    def table(self, tag):
+        offset, length = self.tables[tag]
+        return self.data[offset:offset + length]
+
+    def read_cmap(self):
+        cmap = self.table(b'cmap')
+        count = struct.unpack_from('>H', cmap, 2)[0]
+        subtables = {}
+        for number in range(count):
+            platform, encoding, offset = struct.unpack_from(
+                '>HHI', cmap, 4 + 8 * number)
+            subtables[platform, encoding] = offset
+        for key in ((3, 10), (0, 4), (3, 1), (0, 3)):
+            if key in subtables:
+                return self.read_cmap_subtable(cmap, subtables[key])
+        raise ValueError('В шрифте нет таблицы Unicode cmap')
+
+    def read_cmap_subtable(self, cmap, offset):
+        fmt = struct.unpack_from('>H', cmap, offset)[0]
+        mapping = {}
+        if fmt == 12:
+            groups = struct.unpack_from('>I', cmap, offset + 12)[0]
+            for number in range(groups):
+                start, end, glyph = struct.unpack_from(
+                    '>3I', cmap, offset + 16 + 12 * number)
+                for code in range(start, end + 1):
+                    mapping[code] = glyph + code - start
+            return mapping
+        if fmt != 4:
+            raise ValueError(f'Формат cmap {fmt} не поддерживается')
+        segments = struct.unpack_from('>H', cmap, offset + 6)[0] // 2
+        ends = offset + 14
+        starts = ends + 2 * segments + 2
+        deltas = starts + 2 * segments
+        range_offsets = deltas + 2 * segments
+        for number in range(segments):
+            end, = struct.unpack_from('>H', cmap, ends + 2 * number)
+            start, = struct.unpack_from('>H', cmap, starts + 2 * number)
+            delta, = struct.unpack_from('>h', cmap, deltas + 2 * number)
+            position = range_offsets + 2 * number
+            range_offset, = struct.unpack_from('>H', cmap, position)
+            for code in range(start, min(end, 0xFFFE) + 1):
+                if range_offset:
+                    glyph, = struct.unpack_from(
+                        '>H', cmap,
+                        position + range_offset + 2 * (code - start))
+                    if glyph:
+                        glyph = (glyph + delta) & 0xFFFF
+                else:
+                    glyph = (code + delta) & 0xFFFF
+                if glyph:
+                    mapping[code] = glyph
+        return mapping
+
+    def glyph(self, char):
+        """Номер глифа символа, 0 - глиф отсутствующего символа."""
+        return self.cmap.get(ord(char), 0)
+
+    def width(self, glyph):
+        """Ширина глифа в тысячных долях кегля."""
+        return round(self.advances[glyph] * 1000 / self.units)
+
+    def glyph_data(self, glyph):
+        offset = self.tables[b'glyf'][0]
+        return self.data[offset + self.loca[glyph]:
+                         offset + self.loca[glyph + 1]]
+
+    def components(self, glyph):
+        """Глифы, из которых собран составной глиф."""
+        data = self.glyph_data(glyph)
+        if len(data) < 10 or struct.unpack_from('>h', data)[0] >= 0:
+            return []
+        result = []
+        position = 10
+        flags = MORE_COMPONENTS
+        while flags & MORE_COMPONENTS:
+            flags, component = struct.unpack_from('>HH', data, position)
+            result.append(component)
+            position += 4
+            position += 4 if flags & ARG_1_AND_2_ARE_WORDS else 2
+            if flags & WE_HAVE_A_SCALE:
+                position += 2
+            elif flags & WE_HAVE_AN_X_AND_Y_SCALE:
+                position += 4
+            elif flags & WE_HAVE_A_TWO_BY_TWO:
+                position += 8
+        return result
+
+    def subset_tag(self, glyphs):
+        """Префикс имени подмножества из шести заглавных букв."""
+        digest = hashlib.md5(repr(sorted(glyphs)).encode()).digest()
+        return ''.join(chr(ord('A') + byte % 26) for byte in digest[:6])
+
+    def subset(self, glyphs):
+        """Файл шрифта, в котором остались только глифы `glyphs`
+        и их составные части. Номера глифов не меняются."""
+        keep = {0}
+        pending = list(glyphs)
+        while pending:
+            glyph = pending.pop()
+            if glyph not in keep:
+                keep.add(glyph)
+                pending.extend(self.components(glyph))
+        glyf = bytearray()
+        loca = [0]
+        for glyph in range(len(self.loca) - 1):
+            if glyph in keep:
+                glyf += self.glyph_data(glyph)
+                glyf += b'\0' * (-len(glyf) % 4)
+            loca.append(len(glyf))
+        head = bytearray(self.table(b'head'))
+        struct.pack_into('>I', head, 8, 0)
+        struct.pack_into('>h', head, 50, 1)
+        tables = {
+            tag: self.table(tag)
+            for tag in SUBSET_TABLES if tag in self.tables
+        }
+        tables.update({
+            b'glyf': bytes(glyf),
+            b'loca': struct.pack(f'>{len(loca)}I', *loca),
+            b'head': bytes(head),
+        })
+        font, offsets = self.pack(tables)
+        adjustment = (0xB1B0AFBA - checksum(bytes(font))) & 0xFFFFFFFF
+        struct.pack_into('>I', font, offsets[b'head'] + 8, adjustment)
+        return bytes(font)
+
+    def pack(self, tables):
+        count = len(tables)
+        power = 1 << (count.bit_length() - 1)
+        header = struct.pack('>IHHHH', 0x00010000, count, power * 16,
+                             power.bit_length() - 1, (count - power) * 16)
+        directory = b''
+        body = b''
+        offsets = {}
+        for tag in sorted(tables):
+            data = tables[tag]
+            offsets[tag] = len(header) + 16 * count + len(body)
+            directory += struct.pack(
+                '>4sIII', tag, checksum(data), offsets[tag], len(data))
+            body += data + b'\0' * (-len(data) % 4)
+        return bytearray(header + directory + body), offsets
+
+
+@lru_cache(maxsize=4)
+def load_font(path):
+    """Разобранный шрифт, один на процесс."""
+    return TrueTypeFont(path)
@@ -0,0 +1,184 @@
+import hashlib
+import json
+
+from django.conf import settings
+from django.core.cache import cache
+from django.http import Http404
+from django.shortcuts import get_object_or_404
+from django.utils.cache import get_conditional_response, patch_vary_headers
+from django.utils.http import quote_etag
+from rest_framework.response import Response
+
+from recipes.versions import get_versions, user_state
+
+
+class ConditionalGetMixin:
+    """Условные GET-запросы по ETag для list и retrieve.
+    Если данные не изменились, ответ 304 отдается
+    без выборки объектов и работы сериализаторов.
+    Last-Modified не отправляется: ответ зависит от версий справочников
+    и профилей, у которых нет времени изменения."""
+
+    catalogue_versions = ()
+    personalized = False
+
+    def get_etag_parts(self, request, *args, **kwargs):
+        """Значения, от которых зависит ответ. None - без валидаторов."""
+        parts = [request.get_full_path()]
+        names = list(self.catalogue_versions)
+        if self.personalized and request.user.is_authenticated:
+            parts.append(request.user.id)
+            names.append(user_state(request.user.id))
+        return [*parts, *get_versions(*names)]
+
+    def conditional(self, view, request, *args, **kwargs):
+        parts = self.get_etag_parts(request, *args, **kwargs)
+        if parts is None:
+            return view(request, *args, **kwargs)
+        etag = quote_etag(hashlib.md5(
+            '|'.join(map(str, parts)).encode()).hexdigest())
+        response = get_conditional_response(request, etag=etag)
+        if response is None:
+            response = view(request, *args, **kwargs)
+        if response.status_code in (200, 304):
+            response['ETag'] = etag
+            if self.personalized:
+                patch_vary_headers(response, ('Authorization',))
+        return response
+
+    def list(self, request, *args, **kwargs):
+        return self.conditional(super().list, request, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.conditional(super().retrieve, request, *args, **kwargs)
+
+
+class AnonymousListCacheMixin:
+    """Кэш страниц списка для анонимных пользователей.
+    Ключ строится по нормализованным параметрам запроса и версиям данных,
+    поэтому при изменении данных старые страницы просто перестают читаться."""
+
+    list_cache_prefix = None
+    list_cache_params = ()
+    list_cache_versions = ()
+
+    def get_list_cache_key(self, request):
+        params = request.query_params
+        normalized = [
+            (name, sorted(set(params.getlist(name))))
+            for name in self.list_cache_params
+        ]
+        raw = json.dumps([
+            request.get_host(),
+            normalized,
+            get_versions(*self.list_cache_versions),
+        ])
+        digest = hashlib.md5(raw.encode()).hexdigest()
+        return f'{self.list_cache_prefix}:page:{digest}'
+
+    def count_list_cache(self, result):
+        key = f'{self.list_cache_prefix}:{result}'
+        cache.add(key, 0, None)
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.set(key, 1, None)
+
+    def get_list_cache_stats(self):
+        hits, misses = (
+            cache.get(f'{self.list_cache_prefix}:{result}', 0)
+            for result in ('hits', 'misses'))
+        total = hits + misses
+        return {
+            'hits': hits,
+            'misses': misses,
+            'hit_ratio': hits / total if total else None,
+        }
+
+    def list(self, request, *args, **kwargs):
+        if request.user.is_authenticated:
+            return super().list(request, *args, **kwargs)
+        key = self.get_list_cache_key(request)
+        data = cache.get(key)
+        if data is not None:
+            self.count_list_cache('hits')
+            response = Response(data)
+            response['X-Cache'] = 'HIT'
+            return response
+        self.count_list_cache('misses')
+        response = super().list(request, *args, **kwargs)
+        if response.status_code == 200:
+            cache.set(key, response.data, settings.LIST_CACHE_TIMEOUT)
+        response['X-Cache'] = 'MISS'
+        return response
+
+
+class UserOverlayMixin:
+    """Общий для всех пользователей кэш представлений объектов.
+    Из кэша одним запросом берутся представления страницы,
+    сериализуются только отсутствующие в нем объекты,
+    а персональные поля накладываются поверх в `apply_overlay`."""
+
+    overlay_cache_prefix = None
+    overlay_cache_versions = ()
+
+    def get_overlay_queryset(self):
+        """Легкий запрос для отбора объектов страницы."""
+        raise NotImplementedError
+
+    def get_shared_queryset(self, pks):
+        """Запрос для сериализации объектов, которых нет в кэше."""
+        raise NotImplementedError
+
+    def get_overlay_version(self, obj):
+        raise NotImplementedError
+
+    def apply_overlay(self, request, objects, representations):
+        raise NotImplementedError
+
+    def get_representations(self, request, objects):
+        versions = ':'.join(get_versions(*self.overlay_cache_versions))
+        keys = {
+            obj.pk: (f'{self.overlay_cache_prefix}:{request.get_host()}:'
+                     f'{obj.pk}:{self.get_overlay_version(obj)}:{versions}')
+            for obj in objects
+        }
+        cached = cache.get_many(keys.values())
+        missing = [pk for pk, key in keys.items() if key not in cached]
+        if missing:
+            shared = self.get_shared_queryset(missing)
+            fresh = {
+                keys[obj.pk]: data
+                for obj, data in zip(
+                    shared, self.get_serializer(shared, many=True).data)
+            }
+            cache.set_many(fresh, settings.REPRESENTATION_CACHE_TIMEOUT)
+            cached.update(fresh)
+        # Объект мог быть удален между двумя запросами: пропускаем его.
+        objects = [obj for obj in objects if keys[obj.pk] in cached]
+        representations = [cached[keys[obj.pk]] for obj in objects]
+        self.apply_overlay(request, objects, representations)
+        return representations
+
+    def list(self, request, *args, **kwargs):
+        if request.user.is_anonymous:
+            return super().list(request, *args, **kwargs)
+        queryset = self.filter_queryset(self.get_overlay_queryset())
+        page = self.paginate_queryset(queryset)
+        if page is not None:
+            return self.get_paginated_response(
+                self.get_representations(request, page))
+        return Response(self.get_representations(request, list(queryset)))
+
+    def retrieve(self, request, *args, **kwargs):
+        if request.user.is_anonymous:
+            return super().retrieve(request, *args, **kwargs)
+        lookup_url_kwarg = self.lookup_url_kwarg or self.lookup_field
+        instance = get_object_or_404(
+            self.filter_queryset(self.get_overlay_queryset()),
+            **{self.lookup_field: kwargs[lookup_url_kwarg]})
+        self.check_object_permissions(request, instance)
+        representations = self.get_representations(request, [instance])
+        if not representations:
+            raise Http404
+        return Response(representations[0])
@@ -1,7 +1,181 @@
+import base64
+import hashlib
+import json
+from datetime import datetime
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.exceptions import EmptyResultSet
+from django.core.paginator import Paginator
+from django.db import connections
+from django.db.models import Q
+from django.utils.functional import cached_property
+from rest_framework.exceptions import NotFound
 from rest_framework.pagination import PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+from recipes.versions import get_versions
 
 
 class PagePagination(PageNumberPagination):
     page_size = 6
     page_size_query_param = 'limit'
     max_page_size = 20
+
+
+class CountedPaginator(Paginator):
+    """Paginator, получающий число объектов от `count_func`."""
+
+    def __init__(self, object_list, per_page, count_func, **kwargs):
+        super().__init__(object_list, per_page, **kwargs)
+        self.count_func = count_func
+
+    @cached_property
+    def count(self):
+        return self.count_func(self.object_list)
+
+
+class CachedCountPagination(PagePagination):
+    """Постраничный вывод с кэшированием числа объектов.
+    Ключ кэша - текст запроса с фильтрами и версии данных из
+    `view.get_count_versions()`. Для больших таблиц PostgreSQL без
+    фильтров берется оценка планировщика, о чем говорит `count_exact`."""
+
+    def django_paginator_class(self, object_list, per_page):
+        return CountedPaginator(object_list, per_page, self.get_count)
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.view = view
+        self.count_exact = True
+        return super().paginate_queryset(queryset, request, view)
+
+    def get_count_cache_key(self, queryset):
+        names = ()
+        if hasattr(self.view, 'get_count_versions'):
+            names = self.view.get_count_versions()
+        raw = json.dumps([str(queryset.query), get_versions(*names)])
+        return f'count:{hashlib.md5(raw.encode()).hexdigest()}'
+
+    def estimate_count(self, queryset):
+        """Оценка числа строк таблицы по статистике PostgreSQL."""
+        connection = connections[queryset.db]
+        query = queryset.query
+        if (connection.vendor != 'postgresql' or query.where
+                or query.distinct or query.combinator):
+            return None
+        with connection.cursor() as cursor:
+            cursor.execute(
+                'SELECT reltuples::bigint FROM pg_class '
+                'WHERE oid = %s::regclass',
+                [queryset.model._meta.db_table])
+            row = cursor.fetchone()
+        if row is None or row[0] < settings.ESTIMATED_COUNT_THRESHOLD:
+            return None
+        return row[0]
+
+    def get_count(self, queryset):
+        try:
+            key = self.get_count_cache_key(queryset)
+        except EmptyResultSet:
+            return 0
+        cached = cache.get(key)
+        if cached is None:
+            estimate = self.estimate_count(queryset)
+            if estimate is None:
+                cached = (queryset.count(), True)
+            else:
+                cached = (estimate, False)
+            cache.set(key, cached, settings.COUNT_CACHE_TIMEOUT)
+        count, self.count_exact = cached
+        return count
+
+    def get_paginated_response(self, data):
+        response = super().get_paginated_response(data)
+        response.data['count_exact'] = self.count_exact
+        return response
+
+
+class RecipePagination(CachedCountPagination):
+    """Постраничный вывод рецептов.
+    С параметром `cursor` (для первой страницы - пустым) включается
+    режим курсора: страницы отбираются по ключу (pub_date, id)
+    без COUNT и OFFSET, поэтому глубина страницы не влияет на скорость."""
+
+    cursor_query_param = 'cursor'
+    invalid_cursor_message = 'Неверный курсор.'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.keyset = self.cursor_query_param in request.query_params
+        if not self.keyset:
+            return super().paginate_queryset(queryset, request, view)
+        self.request = request
+        page_size = self.get_page_size(request)
+        reverse, position = self.decode_cursor(
+            request.query_params[self.cursor_query_param])
+        if position is None:
+            queryset = queryset.order_by('-pub_date', '-id')
+        else:
+            pub_date, pk = position
+            if reverse:
+                queryset = queryset.filter(
+                    Q(pub_date__gt=pub_date)
+                    | Q(pub_date=pub_date, id__gt=pk)
+                ).order_by('pub_date', 'id')
+            else:
+                queryset = queryset.filter(
+                    Q(pub_date__lt=pub_date)
+                    | Q(pub_date=pub_date, id__lt=pk)
+                ).order_by('-pub_date', '-id')
+        rows = list(queryset[:page_size + 1])
+        has_more = len(rows) > page_size
+        rows = rows[:page_size]
+        if reverse:
+            rows.reverse()
+        self.has_next = has_more if not reverse else True
+        self.has_previous = has_more if reverse else position is not None
+        self.rows = rows
+        return rows
+
+    def decode_cursor(self, cursor):
+        """Курсор - base64 от [направление, pub_date, id]."""
+        if not cursor:
+            return False, None
+        try:
+            reverse, pub_date, pk = json.loads(
+                base64.urlsafe_b64decode(cursor.encode()))
+            return bool(reverse), (datetime.fromisoformat(pub_date), int(pk))
+        except (TypeError, ValueError):
+            raise NotFound(self.invalid_cursor_message)
+
+    def encode_cursor(self, reverse, recipe):
+        cursor = json.dumps(
+            [int(reverse), recipe.pub_date.isoformat(), recipe.pk])
+        return replace_query_param(
+            remove_query_param(
+                self.request.build_absolute_uri(), self.page_query_param),
+            self.cursor_query_param,
+            base64.urlsafe_b64encode(cursor.encode()).decode())
+
+    def get_next_link(self):
+        if not self.keyset:
+            return super().get_next_link()
+        if not self.has_next or not self.rows:
+            return None
+        return self.encode_cursor(False, self.rows[-1])
+
+    def get_previous_link(self):
+        if not self.keyset:
+            return super().get_previous_link()
+        if not self.has_previous or not self.rows:
+            return None
+        return self.encode_cursor(True, self.rows[0])
+
+    def get_paginated_response(self, data):
+        if not self.keyset:
+            return super().get_paginated_response(data)
+        return Response({
+            'next': self.get_next_link(),
+            'previous': self.get_previous_link(),
+            'results': data,
+        })
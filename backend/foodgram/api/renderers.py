@@ -0,0 +1,258 @@
+import csv
+import json
+import zlib
+
+from django.conf import settings
+from rest_framework.renderers import BaseRenderer
+
+from .fonts import load_font
+
+TITLE = 'Список покупок'
+
+
+class Echo:
+    """Объект с интерфейсом файла, возвращающий записанную строку."""
+
+    def write(self, value):
+        return value
+
+
+class ShoppingListRenderer(BaseRenderer):
+    """Базовый рендерер списка покупок.
+    Строки списка отдаются потоком через `stream`,
+    `render` используется только для сообщений об ошибках,
+    они отдаются в JSON с соответствующим типом содержимого."""
+
+    charset = 'utf-8'
+    extension = None
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        response = (renderer_context or {}).get('response')
+        if response is not None:
+            response['Content-Type'] = 'application/json; charset=utf-8'
+        return json.dumps(data, ensure_ascii=False).encode('utf-8')
+
+    def stream(self, rows):
+        """Принимает итератор кортежей (название, количество, единица)."""
+        raise NotImplementedError
+
+
+class TxtShoppingListRenderer(ShoppingListRenderer):
+    media_type = 'text/plain'
+    format = 'txt'
+    extension = 'txt'
+
+    def stream(self, rows):
+        yield f'{TITLE}:\n'
+        for name, amount, unit in rows:
+            yield f'{name} - {amount} {unit}\n'
+
+
+class CsvShoppingListRenderer(ShoppingListRenderer):
+    media_type = 'text/csv'
+    format = 'csv'
+    extension = 'csv'
+
+    def stream(self, rows):
+        writer = csv.writer(Echo())
+        yield writer.writerow(('name', 'amount', 'measurement_unit'))
+        for row in rows:
+            yield writer.writerow(row)
+
+
+class JsonShoppingListRenderer(ShoppingListRenderer):
+    media_type = 'application/json'
+    format = 'json'
+    extension = 'json'
+
+    def stream(self, rows):
+        separator = ''
+        yield '['
+        for name, amount, unit in rows:
+            yield separator + json.dumps(
+                {'name': name, 'amount': amount, 'measurement_unit': unit},
+                ensure_ascii=False)
+            separator = ','
+        yield ']'
+
+
+class PdfShoppingListRenderer(ShoppingListRenderer):
+    """PDF-документ, собираемый постранично.
+    Строки пишутся текстом шрифтом SHOPPING_CART_FONT, поэтому их
+    можно выделять и искать. Каждая страница сразу отдается клиенту,
+    а шрифт с использованными глифами встраивается в конце документа."""
+
+    media_type = 'application/pdf'
+    format = 'pdf'
+    charset = None
+    extension = 'pdf'
+
+    page_size = (595, 842)
+    margin = 50
+    font_size = 12
+    line_height = 16
+
+    # Номера объектов документа; страницы нумеруются с FIRST_PAGE.
+    CATALOG, PAGES, FONT, CID_FONT, DESCRIPTOR, FONT_FILE, TO_UNICODE = (
+        range(1, 8))
+    FIRST_PAGE = 8
+
+    def stream(self, rows):
+        """Шрифт загружается до начала ответа:
+        если его нет, запрос завершится ошибкой, а не обрывом файла."""
+        return self.write_document(
+            rows, load_font(settings.SHOPPING_CART_FONT))
+
+    def paginate(self, rows):
+        width, height = self.page_size
+        per_page = (height - 2 * self.margin) // self.line_height
+        lines = [f'{TITLE}:']
+        for name, amount, unit in rows:
+            lines.append(f'{name} - {amount} {unit}')
+            if len(lines) == per_page:
+                yield lines
+                lines = []
+        if lines:
+            yield lines
+
+    def page_content(self, lines, font, used):
+        """Текст страницы в номерах глифов, `used` пополняется
+        соответствием глиф - символ для ToUnicode."""
+        width, height = self.page_size
+        commands = [
+            f'BT /F1 {self.font_size} Tf {self.line_height} TL '
+            f'{self.margin} {height - self.margin - self.font_size} Td'
+        ]
+        for line in lines:
+            glyphs = []
+            for char in line:
+                glyph = font.glyph(char)
+                used.setdefault(glyph, char)
+                glyphs.append(f'{glyph:04X}')
+            commands.append(f'<{"".join(glyphs)}> Tj T*')
+        commands.append('ET')
+        return '\n'.join(commands).encode()
+
+    def font_objects(self, font, used):
+        """Шрифт Type0 с кодировкой Identity-H: номер глифа
+        в тексте совпадает с номером глифа во встроенном файле."""
+        name = f'{font.subset_tag(used)}+{font.name}'
+        widths = ' '.join(
+            f'{glyph} [{font.width(glyph)}]' for glyph in sorted(used))
+        scale = 1000 / font.units
+        bbox = ' '.join(str(round(value * scale)) for value in font.bbox)
+        ascent = round(font.ascent * scale)
+        descent = round(font.descent * scale)
+        file = font.subset(used)
+        data = zlib.compress(file)
+        yield self.FONT, (
+            f'<< /Type /Font /Subtype /Type0 /BaseFont /{name} '
+            f'/Encoding /Identity-H '
+            f'/DescendantFonts [{self.CID_FONT} 0 R] '
+            f'/ToUnicode {self.TO_UNICODE} 0 R >>').encode()
+        yield self.CID_FONT, (
+            f'<< /Type /Font /Subtype /CIDFontType2 /BaseFont /{name} '
+            f'/CIDSystemInfo << /Registry (Adobe) /Ordering (Identity) '
+            f'/Supplement 0 >> /FontDescriptor {self.DESCRIPTOR} 0 R '
+            f'/CIDToGIDMap /Identity /W [{widths}] >>').encode()
+        yield self.DESCRIPTOR, (
+            f'<< /Type /FontDescriptor /FontName /{name} /Flags 32 '
+            f'/FontBBox [{bbox}] /ItalicAngle 0 /Ascent {ascent} '
+            f'/Descent {descent} /CapHeight {ascent} /StemV 80 '
+            f'/FontFile2 {self.FONT_FILE} 0 R >>').encode()
+        yield self.FONT_FILE, stream_object(
+            data, f'/Length1 {len(file)} /Filter /FlateDecode')
+        yield self.TO_UNICODE, stream_object(to_unicode(used))
+
+    def write_document(self, rows, font):
+        width, height = self.page_size
+        offsets = {}
+        kids = []
+        used = {}
+        position = 0
+        number = self.FIRST_PAGE
+
+        def write(number, body):
+            nonlocal position
+            offsets[number] = position
+            chunk = (f'{number} 0 obj\n'.encode() + body
+                     + b'\nendobj\n')
+            position += len(chunk)
+            return chunk
+
+        header = b'%PDF-1.4\n%\xe2\xe3\xcf\xd3\n'
+        position += len(header)
+        yield header
+        yield write(self.CATALOG, (
+            f'<< /Type /Catalog /Pages {self.PAGES} 0 R >>').encode())
+
+        for lines in self.paginate(rows):
+            content = zlib.compress(self.page_content(lines, font, used))
+            yield write(number, stream_object(content, '/Filter /FlateDecode'))
+            yield write(number + 1, (
+                f'<< /Type /Page /Parent {self.PAGES} 0 R '
+                f'/MediaBox [0 0 {width} {height}] '
+                f'/Resources << /Font << /F1 {self.FONT} 0 R >> >> '
+                f'/Contents {number} 0 R >>').encode())
+            kids.append(number + 1)
+            number += 2
+
+        yield write(self.PAGES, (
+            '<< /Type /Pages /Kids ['
+            + ' '.join(f'{kid} 0 R' for kid in kids)
+            + f'] /Count {len(kids)} >>').encode())
+        for object_number, body in self.font_objects(font, used):
+            yield write(object_number, body)
+
+        xref = [f'xref\n0 {number}\n', '0000000000 65535 f \n']
+        xref.extend(f'{offsets[object_number]:010d} 00000 n \n'
+                    for object_number in range(1, number))
+        yield ''.join(xref).encode()
+        yield (f'trailer\n<< /Size {number} /Root {self.CATALOG} 0 R >>\n'
+               f'startxref\n{position}\n%%EOF\n').encode()
+
+
+def stream_object(data, entries=''):
+    return (f'<< /Length {len(data)} {entries}>>\nstream\n'.encode()
+            + data + b'\nendstream')
+
+
+def to_unicode(used):
+    """CMap, по которому просмотрщик восстанавливает текст из глифов."""
+    lines = [
+        '/CIDInit /ProcSet findresource begin',
+        '12 dict begin',
+        'begincmap',
+        '/CIDSystemInfo << /Registry (Adobe) /Ordering (UCS) '
+        '/Supplement 0 >> def',
+        '/CMapName /Adobe-Identity-UCS def',
+        '/CMapType 2 def',
+        '1 begincodespacerange',
+        '<0000> <FFFF>',
+        'endcodespacerange',
+    ]
+    pairs = sorted(used.items())
+    for start in range(0, len(pairs), 100):
+        chunk = pairs[start:start + 100]
+        lines.append(f'{len(chunk)} beginbfchar')
+        lines.extend(
+            f'<{glyph:04X}> <{char.encode("utf-16-be").hex().upper()}>'
+            for glyph, char in chunk)
+        lines.append('endbfchar')
+    lines.extend([
+        'endcmap',
+        'CMapName currentdict /CMap defineresource pop',
+        'end',
+        'end',
+    ])
+    return '\n'.join(lines).encode()
+
+
+SHOPPING_LIST_RENDERERS = (
+    TxtShoppingListRenderer,
+    CsvShoppingListRenderer,
+    JsonShoppingListRenderer,
+    PdfShoppingListRenderer,
+)
@@ -1,19 +1,25 @@
 import django.contrib.auth.password_validation as validators
+from django.conf import settings
 from django.contrib.auth import get_user_model
 from django.core import exceptions as django_exceptions
+from django.db import transaction
+from django.db.models import Prefetch, prefetch_related_objects
 from djoser.serializers import UserCreateSerializer
-from django.shortcuts import get_object_or_404
 from rest_framework import serializers
 
-from .fields import Base64ImageField
+from .fields import UPLOAD_PREFIX, Base64ImageField, ImageVariantsField
 from recipes.models import (Tag,
+                            ImageUpload,
                             Recipe,
                             Ingredient,
                             RecipeIngredient,
+                            ShoppingListItem,
                             Subscription)
 
 User = get_user_model()
 
+BULK_MAX_IDS = 100
+
 
 class UserCreateSerializer(UserCreateSerializer):
     """Сериализатор для регистрации пользователей.
@@ -46,6 +52,8 @@ class UserSerializer(serializers.ModelSerializer):
                   'first_name', 'last_name', 'is_subscribed',)
 
     def get_is_subscribed(self, obj):
+        if hasattr(obj, 'is_subscribed'):
+            return obj.is_subscribed
         if (self.context.get('request')
            and not self.context['request'].user.is_anonymous):
             user = self.context.get('request').user
@@ -126,16 +134,26 @@ class RecipeSerializer(serializers.ModelSerializer):
     is_favorited = serializers.SerializerMethodField()
     is_in_shopping_cart = serializers.SerializerMethodField()
     image = Base64ImageField()
+    image_variants = ImageVariantsField()
 
     def get_is_favorited(self, obj):
+        if hasattr(obj, 'is_favorited'):
+            return obj.is_favorited
         user = self.context['request'].user
         return (user.is_authenticated
-                and bool(obj.favorites_recipe.filter(user=user)))
+                and obj.favorites_recipe.filter(user=user).exists())
 
     def get_is_in_shopping_cart(self, obj):
+        if hasattr(obj, 'is_in_shopping_cart'):
+            return obj.is_in_shopping_cart
         user = self.context['request'].user
         return (user.is_authenticated
-                and bool(obj.shopping_recipe.filter(user=user)))
+                and obj.shopping_recipe.filter(user=user).exists())
+
+    def to_representation(self, instance):
+        if hasattr(instance, 'author_is_subscribed'):
+            instance.author.is_subscribed = instance.author_is_subscribed
+        return super().to_representation(instance)
 
     class Meta:
         model = Recipe
@@ -147,6 +165,7 @@ class RecipeSerializer(serializers.ModelSerializer):
                   'is_in_shopping_cart',
                   'name',
                   'image',
+                  'image_variants',
                   'text',
                   'cooking_time',)
 
@@ -186,18 +205,26 @@ class RecipeCreateSerializer(serializers.ModelSerializer):
             'cooking_time': {'required': True},
         }
 
-    def validate(self, data):
-        ingredients = data['ingredients']
-        ingredient_list = []
-        for items in ingredients:
-            ingredient = get_object_or_404(
-                Ingredient, id=items['id'])
-            if ingredient in ingredient_list:
-                raise serializers.ValidationError(
-                    'Ингредиент должен быть уникальным!')
-            ingredient_list.append(ingredient)
-
-        return data
+    def validate_ingredients(self, value):
+        """Все ингредиенты проверяются одним запросом,
+        ошибки возвращаются по позициям списка."""
+        ids = [item['id'] for item in value]
+        existing = set(Ingredient.objects.filter(
+            id__in=ids).values_list('id', flat=True))
+        seen = set()
+        errors = []
+        for ingredient_id in ids:
+            if ingredient_id not in existing:
+                errors.append({'id': [
+                    f'Ингредиент с id={ingredient_id} не найден.']})
+            elif ingredient_id in seen:
+                errors.append({'id': ['Ингредиент должен быть уникальным!']})
+            else:
+                errors.append({})
+            seen.add(ingredient_id)
+        if any(errors):
+            raise serializers.ValidationError(errors)
+        return value
 
     def create_objects(self, ingredient_list, recipe):
         """Функция для создания новых объектов."""
@@ -210,38 +237,118 @@ class RecipeCreateSerializer(serializers.ModelSerializer):
             recipe_ingredient_list.append(recipe_ingredient)
         RecipeIngredient.objects.bulk_create(recipe_ingredient_list)
 
+    def update_objects(self, ingredient_list, recipe):
+        """Записывает только изменения состава рецепта
+        и возвращает изменения количеств для списков покупок.
+        Состав читается заново под блокировкой рецепта из `update`,
+        а не из загруженного до нее prefetch."""
+        amounts = {item['id']: item['amount'] for item in ingredient_list}
+        current = {row.ingredient_id: row
+                   for row in RecipeIngredient.objects.filter(recipe=recipe)}
+        changes = {}
+        changed = []
+        removed = []
+        for ingredient_id, row in current.items():
+            amount = amounts.get(ingredient_id, 0)
+            if amount == row.amount:
+                continue
+            changes[ingredient_id] = amount - row.amount
+            if amount:
+                row.amount = amount
+                changed.append(row)
+            else:
+                removed.append(row.pk)
+        added = [item for item in ingredient_list
+                 if item['id'] not in current]
+        for item in added:
+            changes[item['id']] = item['amount']
+        if removed:
+            RecipeIngredient.objects.filter(pk__in=removed).delete()
+        if changed:
+            RecipeIngredient.objects.bulk_update(changed, ('amount',))
+        if added:
+            self.create_objects(added, recipe)
+        return changes
+
+    @transaction.atomic
     def create(self, validated_data):
         tags = validated_data.pop('tags')
         ingredient_list = validated_data.pop('ingredients')
         recipe = Recipe.objects.create(**validated_data)
         recipe.tags.set(tags)
         self.create_objects(ingredient_list, recipe)
-
+        recipe.is_favorited = recipe.is_in_shopping_cart = False
+        recipe.author_is_subscribed = False
         return recipe
 
+    @transaction.atomic
     def update(self, instance, validated_data):
-
-        tags = validated_data.pop('tags')
-        instance.tags.set(tags)
-
-        ingredient_list = validated_data.pop('ingredients')
-        instance.ingredients.clear()
-        self.create_objects(ingredient_list, instance)
+        # Параллельные изменения рецепта идут по очереди: иначе оба
+        # считают разницу от одного состава и итоги списков покупок
+        # получают ее дважды.
+        Recipe.objects.select_for_update().filter(pk=instance.pk).exists()
+        tags = validated_data.pop('tags', None)
+        if tags is not None:
+            instance.tags.set(tags)
+
+        ingredient_list = validated_data.pop('ingredients', None)
+        if ingredient_list is not None:
+            ShoppingListItem.objects.change_recipe(
+                instance, self.update_objects(ingredient_list, instance))
 
         return super().update(instance, validated_data)
 
     def to_representation(self, instance):
+        """Ответ строится по рецепту с заново загруженными
+        тегами и ингредиентами."""
+        instance._prefetched_objects_cache = {}
+        prefetch_related_objects(
+            [instance],
+            'tags',
+            Prefetch('recipes',
+                     queryset=RecipeIngredient.objects.select_related(
+                         'ingredient')),
+        )
         return RecipeSerializer(instance,
                                 context=self.context).data
 
 
+class ShoppingListItemSerializer(serializers.ModelSerializer):
+    """Итоговое количество ингредиента в списке покупок."""
+    id = serializers.ReadOnlyField(
+        source='ingredient.id'
+    )
+    name = serializers.ReadOnlyField(
+        source='ingredient.name'
+    )
+    measurement_unit = serializers.ReadOnlyField(
+        source='ingredient.measurement_unit'
+    )
+
+    class Meta:
+        model = ShoppingListItem
+        fields = ('id', 'name', 'measurement_unit', 'amount',)
+
+
+class BulkIdsSerializer(serializers.Serializer):
+    """Список id рецептов или авторов для пакетных операций."""
+
+    ids = serializers.ListField(
+        child=serializers.IntegerField(min_value=1),
+        allow_empty=False,
+        max_length=BULK_MAX_IDS,
+    )
+
+
 class SubFavCartRecipeSerializer(serializers.ModelSerializer):
     """Сериализатор для отображения рецепта в
     Подписках, Избранном и Списке покупок."""
 
+    image_variants = ImageVariantsField()
+
     class Meta:
         model = Recipe
-        fields = ('id', 'name', 'image', 'cooking_time')
+        fields = ('id', 'name', 'image', 'image_variants', 'cooking_time')
 
 
 class SubscriptionSerializer(serializers.ModelSerializer):
@@ -249,7 +356,7 @@ class SubscriptionSerializer(serializers.ModelSerializer):
 
     is_subscribed = serializers.SerializerMethodField()
     recipes = serializers.SerializerMethodField()
-    recipes_count = serializers.SerializerMethodField()
+    recipes_count = serializers.IntegerField(read_only=True)
 
     class Meta:
         model = User
@@ -265,6 +372,8 @@ class SubscriptionSerializer(serializers.ModelSerializer):
         )
 
     def get_is_subscribed(self, obj):
+        if hasattr(obj, 'is_subscribed'):
+            return obj.is_subscribed
         return (
             self.context.get('request').user.is_authenticated
             and Subscription.objects.filter(user=self.context['request'].user,
@@ -282,9 +391,6 @@ class SubscriptionSerializer(serializers.ModelSerializer):
         )
         return serializer.data
 
-    def get_recipes_count(self, obj):
-        return obj.recipes.count()
-
 
 class SubscriptionCreateSerializer(serializers.ModelSerializer):
     """Сериализатор для подписки на автора."""
@@ -303,7 +409,7 @@ class SubscriptionCreateSerializer(serializers.ModelSerializer):
     is_subscribed = serializers.BooleanField(
         read_only=True)
     recipes_count = serializers.IntegerField(
-        read_only=True)
+        source='author.recipes_count', read_only=True)
 
     class Meta:
         model = Subscription
@@ -320,3 +426,27 @@ class SubscriptionCreateSerializer(serializers.ModelSerializer):
         return SubFavCartRecipeSerializer(
             recipes,
             many=True).data
+
+
+class ImageUploadSerializer(serializers.ModelSerializer):
+    """Сеанс загрузки картинки по частям.
+    В поле image возвращается значение для поля картинки рецепта."""
+
+    image = serializers.SerializerMethodField()
+
+    class Meta:
+        model = ImageUpload
+        fields = ('token', 'size', 'received', 'completed', 'image',)
+        read_only_fields = ('token', 'received', 'completed',)
+
+    def validate_size(self, value):
+        max_size = settings.IMAGE_UPLOAD_MAX_SIZE
+        if not 0 < value <= max_size:
+            raise serializers.ValidationError(
+                f'Размер файла должен быть от 1 до {max_size} байт.')
+        return value
+
+    def get_image(self, obj):
+        if not obj.completed:
+            return None
+        return f'{UPLOAD_PREFIX}{obj.token}'
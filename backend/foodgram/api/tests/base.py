@@ -0,0 +1,78 @@
+"""Общие данные и настройки тестов API."""
+import tempfile
+from io import BytesIO
+
+from django.contrib.auth import get_user_model
+from django.core.files.base import ContentFile
+from django.db import connection
+from PIL import Image
+
+from recipes.models import Ingredient, Recipe, RecipeIngredient, Tag
+
+User = get_user_model()
+
+MEDIA_ROOT = tempfile.mkdtemp(prefix='foodgram-tests-')
+
+TEST_SETTINGS = {
+    'MEDIA_ROOT': MEDIA_ROOT,
+    'UPLOAD_SESSION_DIR': f'{MEDIA_ROOT}/uploads',
+    'IMAGE_VARIANT_WORKERS': 0,
+    'CACHES': {'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    }},
+    'PASSWORD_HASHERS': ['django.contrib.auth.hashers.MD5PasswordHasher'],
+}
+
+
+def make_png():
+    buffer = BytesIO()
+    Image.new('RGB', (1, 1)).save(buffer, 'PNG')
+    return buffer.getvalue()
+
+
+PNG = make_png()
+
+
+def create_user(name, **fields):
+    return User.objects.create_user(
+        username=name, email=f'{name}@example.com', password='Test-12345',
+        first_name='Test', last_name=name, **fields)
+
+
+def create_tags(count):
+    return [
+        Tag.objects.create(
+            name=f'tag-{i}', color=f'#00000{i}', slug=f'tag-{i}')
+        for i in range(count)
+    ]
+
+
+def create_ingredients(count):
+    Ingredient.objects.bulk_create(
+        Ingredient(name=f'ingredient-{i:03}', measurement_unit='г')
+        for i in range(count))
+    return list(Ingredient.objects.filter(name__startswith='ingredient-'))
+
+
+def create_recipes(author, count, tags=(), ingredients=()):
+    """Рецепты автора с тегами `tags` и ингредиентами `ingredients`."""
+    recipes = []
+    for i in range(count):
+        recipe = Recipe(
+            author=author, name=f'{author.username}-{i}', text='text',
+            cooking_time=1)
+        recipe.image.save('recipe.png', ContentFile(PNG), save=False)
+        recipe.save()
+        recipe.tags.set(tags)
+        recipes.append(recipe)
+    RecipeIngredient.objects.bulk_create(
+        RecipeIngredient(recipe=recipe, ingredient=ingredient, amount=1)
+        for recipe in recipes
+        for ingredient in ingredients)
+    return recipes
+
+
+def estimate_queries():
+    """Число запросов к статистике PostgreSQL, которое делают
+    постраничные списки без фильтров."""
+    return int(connection.vendor == 'postgresql')
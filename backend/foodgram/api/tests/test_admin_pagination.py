@@ -0,0 +1,55 @@
+from unittest import mock
+
+from django.test import TestCase, override_settings
+
+from recipes.admin import IngredientAdmin
+from .base import TEST_SETTINGS, create_ingredients, create_user
+
+URL = '/admin/recipes/ingredient/'
+
+
+@override_settings(**TEST_SETTINGS, ADMIN_COUNT_LIMIT=5)
+@mock.patch.object(IngredientAdmin, 'list_per_page', 2)
+class LimitedCountPaginatorTest(TestCase):
+    """Список админки после предела подсчета: число строк
+    выводится как «5+», все страницы остаются доступны."""
+
+    @classmethod
+    def setUpTestData(cls):
+        create_ingredients(11)
+        cls.admin = create_user('admin', is_staff=True, is_superuser=True)
+
+    def setUp(self):
+        self.client.force_login(self.admin)
+
+    def get(self, page):
+        response = self.client.get(URL, {'p': page})
+        self.assertEqual(response.status_code, 200)
+        return response
+
+    def test_lower_bound(self):
+        response = self.get(1)
+        self.assertContains(response, '5+')
+        self.assertEqual(response.context['cl'].paginator.num_pages, 3)
+
+    def test_pages_past_limit(self):
+        rows = []
+        for page in range(1, 7):
+            cl = self.get(page).context['cl']
+            rows += [ingredient.pk for ingredient in cl.result_list]
+            self.assertEqual(
+                cl.paginator.num_pages, max(3, min(page + 1, 6)))
+        self.assertEqual(len(rows), 11)
+        self.assertEqual(len(set(rows)), 11)
+
+    def test_past_last_page(self):
+        response = self.client.get(URL, {'p': 7})
+        self.assertRedirects(response, f'{URL}?e=1')
+
+    def test_exact_count(self):
+        with override_settings(ADMIN_COUNT_LIMIT=100):
+            response = self.get(6)
+            self.assertEqual(response.context['cl'].result_count, 11)
+            self.assertNotContains(response, '11+')
+            self.assertEqual(
+                self.client.get(URL, {'p': 7}).status_code, 302)
@@ -0,0 +1,176 @@
+import threading
+from collections import Counter
+
+from django.core.cache import cache
+from django.db import connection, transaction
+from django.test import (TransactionTestCase, override_settings,
+                         skipUnlessDBFeature)
+from rest_framework.test import APIClient
+
+from recipes.models import Favorite, Recipe, ShoppingListItem
+from recipes.variants import release_image
+from .base import (TEST_SETTINGS, create_ingredients, create_recipes,
+                   create_tags, create_user)
+
+THREADS = 8
+
+
+@skipUnlessDBFeature('test_db_allows_multiple_connections')
+@override_settings(**TEST_SETTINGS)
+class ParallelToggleTest(TransactionTestCase):
+    """Одновременные добавления и удаления рецепта в избранное
+    и корзину: засчитывается ровно одно, итоги и счетчики верны.
+    SQLite не дает писать из нескольких соединений, тесты идут
+    на PostgreSQL."""
+
+    def setUp(self):
+        cache.clear()
+        self.user = create_user('reader')
+        author = create_user('author')
+        ingredients = create_ingredients(3)
+        self.recipe, other = create_recipes(
+            author, 2, create_tags(1), ingredients)
+        client = APIClient()
+        client.force_authenticate(self.user)
+        client.post(f'/api/recipes/{other.id}/shopping_cart/')
+
+    def send_all(self, requests):
+        """Коды ответов на одновременные запросы
+        (метод, адрес, данные), каждый в своем потоке."""
+        barrier = threading.Barrier(len(requests))
+        statuses = []
+
+        def send(method, url, data):
+            client = APIClient()
+            client.force_authenticate(self.user)
+            barrier.wait()
+            try:
+                statuses.append(getattr(client, method)(
+                    url, data, format='json').status_code)
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=send, args=request)
+                   for request in requests]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return Counter(statuses)
+
+    def hammer(self, method, url):
+        return self.send_all([(method, url, None)] * THREADS)
+
+    def assert_one(self, statuses, success, failure):
+        self.assertEqual(
+            statuses, Counter({success: 1, failure: THREADS - 1}))
+
+    def assert_shopping_list(self):
+        self.assertCountEqual(
+            ShoppingListItem.objects.values_list(
+                'user', 'ingredient', 'amount'),
+            ShoppingListItem.objects.expected())
+
+    def test_favorite(self):
+        url = f'/api/recipes/{self.recipe.id}/favorite/'
+        self.assert_one(self.hammer('post', url), 201, 400)
+        self.recipe.refresh_from_db()
+        self.assertEqual(self.recipe.favorites_count, 1)
+        self.assert_one(self.hammer('delete', url), 204, 404)
+        self.recipe.refresh_from_db()
+        self.assertEqual(self.recipe.favorites_count, 0)
+
+    def test_shopping_cart(self):
+        url = f'/api/recipes/{self.recipe.id}/shopping_cart/'
+        self.assert_one(self.hammer('post', url), 201, 400)
+        self.assert_shopping_list()
+        self.assert_one(self.hammer('delete', url), 204, 400)
+        self.assert_shopping_list()
+
+    def test_bulk_and_single_favorite(self):
+        """Пакетные добавления и удаления вперемешку с одиночными
+        не сбивают счетчик избранного."""
+        single = f'/api/recipes/{self.recipe.id}/favorite/'
+        bulk = ('/api/recipes/bulk_favorite/', {'ids': [self.recipe.id]})
+        for _ in range(5):
+            for method in ('post', 'delete'):
+                self.send_all(
+                    [(method, single, None), (method, *bulk)]
+                    * (THREADS // 2))
+                self.recipe.refresh_from_db()
+                self.assertEqual(
+                    self.recipe.favorites_count,
+                    Favorite.objects.filter(recipe=self.recipe).count())
+
+
+@skipUnlessDBFeature('test_db_allows_multiple_connections')
+@override_settings(**TEST_SETTINGS)
+class ImageReleaseTest(TransactionTestCase):
+    """Файл без ссылок не удаляется, пока не зафиксирован
+    рецепт, сохраненный с тем же содержимым."""
+
+    def test_release_waits_for_saving_recipe(self):
+        author = create_user('author')
+        recipe, = create_recipes(author, 1)
+        name = recipe.image.name
+        Recipe.objects.filter(pk=recipe.pk).update(image='')
+
+        def release():
+            try:
+                release_image(name, {})
+            finally:
+                connection.close()
+
+        releaser = threading.Thread(target=release)
+        with transaction.atomic():
+            recipe, = create_recipes(author, 1)
+            self.assertEqual(recipe.image.name, name)
+            releaser.start()
+            releaser.join(0.5)
+            self.assertTrue(releaser.is_alive())
+        releaser.join()
+        self.assertTrue(recipe.image.storage.exists(name))
+
+
+@skipUnlessDBFeature('test_db_allows_multiple_connections')
+@override_settings(**TEST_SETTINGS)
+class ParallelRecipeUpdateTest(TransactionTestCase):
+    """Одновременные изменения состава рецепта применяются
+    по очереди: списки покупок совпадают с итоговым составом."""
+
+    def test_amounts(self):
+        cache.clear()
+        author = create_user('author')
+        reader = create_user('reader')
+        ingredient, = create_ingredients(1)
+        recipe, = create_recipes(author, 1, create_tags(1), [ingredient])
+        client = APIClient()
+        client.force_authenticate(reader)
+        client.post(f'/api/recipes/{recipe.id}/shopping_cart/')
+        for round_ in range(5):
+            amounts = [round_ * 10 + i + 2 for i in range(THREADS)]
+            barrier = threading.Barrier(THREADS)
+
+            def patch(amount):
+                client = APIClient()
+                client.force_authenticate(author)
+                barrier.wait()
+                try:
+                    client.patch(
+                        f'/api/recipes/{recipe.id}/',
+                        {'ingredients': [
+                            {'id': ingredient.id, 'amount': amount}]},
+                        format='json')
+                finally:
+                    connection.close()
+
+            threads = [threading.Thread(target=patch, args=(amount,))
+                       for amount in amounts]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+            final = recipe.recipes.get().amount
+            self.assertIn(final, amounts)
+            self.assertEqual(
+                ShoppingListItem.objects.get(user=reader).amount, final)
@@ -0,0 +1,118 @@
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from django.utils.http import http_date
+from rest_framework.test import APIClient
+
+from .base import (TEST_SETTINGS, create_ingredients, create_recipes,
+                   create_tags, create_user)
+
+FAR_FUTURE = http_date(4102444800)
+
+
+@override_settings(**TEST_SETTINGS)
+class ConditionalGetTest(TestCase):
+    """ETag рецептов: 304 при неизменных данных и новый ответ
+    после изменений, которые видны в теле ответа."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.tag, = create_tags(1)
+        cls.ingredient, = create_ingredients(1)
+        cls.author = create_user('author')
+        cls.reader = create_user('reader')
+        cls.recipe, = create_recipes(
+            cls.author, 1, [cls.tag], [cls.ingredient])
+
+    def setUp(self):
+        cache.clear()
+        self.anonymous = APIClient()
+        self.client = APIClient()
+        self.client.force_authenticate(self.reader)
+        self.detail = f'/api/recipes/{self.recipe.id}/'
+
+    def clients(self):
+        return {'anonymous': self.anonymous, 'reader': self.client}
+
+    def urls(self):
+        return (self.detail, '/api/recipes/')
+
+    def remember(self):
+        """ETag каждого клиента и адреса до изменения."""
+        etags = {}
+        for name, client in self.clients().items():
+            for url in self.urls():
+                response = client.get(url)
+                self.assertEqual(response.status_code, 200)
+                self.assertNotIn('Last-Modified', response)
+                etags[name, url] = response['ETag']
+        return etags
+
+    def assert_changed(self, etags, check):
+        for (name, url), etag in etags.items():
+            with self.subTest(name, url=url):
+                response = self.clients()[name].get(
+                    url, HTTP_IF_NONE_MATCH=etag)
+                self.assertEqual(response.status_code, 200)
+                self.assertNotEqual(response['ETag'], etag)
+                data = response.data
+                check(data['results'][0] if 'results' in data else data)
+
+    def test_not_modified(self):
+        for (name, url), etag in self.remember().items():
+            with self.subTest(name, url=url):
+                response = self.clients()[name].get(
+                    url, HTTP_IF_NONE_MATCH=etag)
+                self.assertEqual(response.status_code, 304)
+                self.assertEqual(response['ETag'], etag)
+
+    def test_if_modified_since_alone(self):
+        """Без ETag клиент всегда получает полный ответ."""
+        for name, client in self.clients().items():
+            for url in self.urls():
+                with self.subTest(name, url=url):
+                    response = client.get(
+                        url, HTTP_IF_MODIFIED_SINCE=FAR_FUTURE)
+                    self.assertEqual(response.status_code, 200)
+
+    def test_tag_rename(self):
+        etags = self.remember()
+        self.tag.name = 'renamed'
+        self.tag.save()
+        self.assert_changed(etags, lambda recipe: self.assertEqual(
+            recipe['tags'][0]['name'], 'renamed'))
+
+    def test_ingredient_rename(self):
+        etags = self.remember()
+        self.ingredient.name = 'renamed'
+        self.ingredient.save()
+        self.assert_changed(etags, lambda recipe: self.assertEqual(
+            recipe['ingredients'][0]['name'], 'renamed'))
+
+    def test_profile_edit(self):
+        etags = self.remember()
+        self.author.first_name = 'Renamed'
+        self.author.save()
+        self.assert_changed(etags, lambda recipe: self.assertEqual(
+            recipe['author']['first_name'], 'Renamed'))
+
+    def test_recipe_edit(self):
+        etags = self.remember()
+        author = APIClient()
+        author.force_authenticate(self.author)
+        with self.captureOnCommitCallbacks(execute=True):
+            response = author.patch(
+                self.detail, {'name': 'renamed'}, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assert_changed(etags, lambda recipe: self.assertEqual(
+            recipe['name'], 'renamed'))
+
+    def test_favorite_toggle(self):
+        url = f'{self.detail}favorite/'
+        for method, favorited in (('post', True), ('delete', False)):
+            with self.subTest(method):
+                etag = self.client.get(self.detail)['ETag']
+                getattr(self.client, method)(url)
+                response = self.client.get(
+                    self.detail, HTTP_IF_NONE_MATCH=etag)
+                self.assertEqual(response.status_code, 200)
+                self.assertEqual(response.data['is_favorited'], favorited)
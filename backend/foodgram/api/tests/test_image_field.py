@@ -0,0 +1,46 @@
+import base64
+from unittest import mock
+
+from django.test import SimpleTestCase, override_settings
+from rest_framework.exceptions import ValidationError
+
+from api.fields import Base64ImageField
+from .base import PNG, TEST_SETTINGS
+
+PREFIX = 'data:image/png;base64,'
+ENCODED = base64.b64encode(PNG).decode()
+
+
+@override_settings(**TEST_SETTINGS)
+class Base64ImageFieldTest(SimpleTestCase):
+    """Декодирование data URI по частям."""
+
+    def decode(self, encoded):
+        upload = Base64ImageField().to_internal_value(PREFIX + encoded)
+        upload.seek(0)
+        return upload.read()
+
+    def wrapped(self, width, separator='\n'):
+        return separator.join(
+            ENCODED[i:i + width] for i in range(0, len(ENCODED), width))
+
+    def test_plain(self):
+        self.assertEqual(self.decode(ENCODED), PNG)
+
+    def test_wrapped(self):
+        for separator in ('\n', '\r\n', ' ', '\t'):
+            with self.subTest(separator=repr(separator)):
+                self.assertEqual(
+                    self.decode(self.wrapped(76, separator)), PNG)
+
+    def test_unaligned_chunks(self):
+        for chunk_size in (3, 5, 7, 13):
+            with self.subTest(chunk_size=chunk_size), \
+                    mock.patch('api.fields.CHUNK_SIZE', chunk_size):
+                self.assertEqual(self.decode(self.wrapped(5)), PNG)
+
+    def test_invalid(self):
+        for encoded in (ENCODED[:-1], ENCODED + '*', '*' + ENCODED):
+            with self.subTest(encoded=encoded[-8:]), \
+                    self.assertRaises(ValidationError):
+                self.decode(encoded)
@@ -0,0 +1,56 @@
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from rest_framework.test import APIClient
+
+from recipes.models import Ingredient
+from .base import TEST_SETTINGS
+
+NAMES = (
+    'абрикос',
+    'абрикосы сушеные',
+    'сок абрикосовый',
+    'курага',
+    'кабачок',
+    'апельсин',
+)
+
+
+@override_settings(**TEST_SETTINGS)
+class IngredientSearchTest(TestCase):
+    """Поиск ингредиентов `?q=`: на PostgreSQL запросом с pg_trgm,
+    на других базах по индексу в памяти. Порядок одинаковый:
+    начало названия, подстрока, похожие по триграммам."""
+
+    @classmethod
+    def setUpTestData(cls):
+        Ingredient.objects.bulk_create(
+            Ingredient(name=name, measurement_unit='г') for name in NAMES)
+
+    def setUp(self):
+        cache.clear()
+
+    def search(self, query):
+        response = APIClient().get('/api/ingredients/', {'q': query})
+        self.assertEqual(response.status_code, 200)
+        return [ingredient['name'] for ingredient in response.data]
+
+    def test_ranking(self):
+        self.assertEqual(
+            self.search('абрикос'),
+            ['абрикос', 'абрикосы сушеные', 'сок абрикосовый'])
+
+    def test_substring(self):
+        self.assertEqual(self.search('сушен'), ['абрикосы сушеные'])
+
+    def test_typo(self):
+        self.assertEqual(self.search('абрикоз')[0], 'абрикос')
+
+    def test_keyboard_layout(self):
+        self.assertEqual(self.search('f,hbrjc')[0], 'абрикос')
+
+    def test_case_and_spaces(self):
+        self.assertEqual(self.search('  КУРАГА ')[0], 'курага')
+
+    def test_no_match(self):
+        self.assertEqual(self.search('шоколад'), [])
+        self.assertEqual(self.search('   '), [])
@@ -0,0 +1,115 @@
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from rest_framework.test import APIClient
+
+from recipes.models import Recipe
+from .base import (TEST_SETTINGS, create_ingredients, create_recipes,
+                   create_tags, create_user)
+
+URL = '/api/recipes/'
+
+
+@override_settings(**TEST_SETTINGS)
+class AnonymousListCacheTest(TestCase):
+    """Кэш страниц списка рецептов для анонимов: попадания
+    и сброс после изменений, видимых в списке."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.tags = create_tags(2)
+        cls.ingredient, = create_ingredients(1)
+        cls.author = create_user('author')
+        cls.recipes = create_recipes(
+            cls.author, 3, cls.tags, [cls.ingredient])
+
+    def setUp(self):
+        cache.clear()
+        self.anonymous = APIClient()
+
+    def get(self, params=None):
+        response = self.anonymous.get(URL, params)
+        self.assertEqual(response.status_code, 200)
+        return response
+
+    def assert_refreshed(self, check, params=None):
+        """Кэш заполнен до изменения, после него страница строится
+        заново и показывает новые данные."""
+        response = self.get(params)
+        self.assertEqual(response['X-Cache'], 'MISS')
+        check(response.data['results'])
+
+    def test_hit(self):
+        first = self.get()
+        self.assertEqual(first['X-Cache'], 'MISS')
+        with self.assertNumQueries(0):
+            second = self.get()
+        self.assertEqual(second['X-Cache'], 'HIT')
+        self.assertEqual(second.data, first.data)
+
+    def test_normalized_params(self):
+        self.get({'tags': ['tag-0', 'tag-1'], 'page': 1})
+        response = self.get({'tags': ['tag-1', 'tag-0', 'tag-1'],
+                             'page': 1, 'unknown': 'x'})
+        self.assertEqual(response['X-Cache'], 'HIT')
+        self.assertEqual(self.get({'tags': 'tag-0'})['X-Cache'], 'MISS')
+        self.assertEqual(self.get({'limit': 1})['X-Cache'], 'MISS')
+
+    def test_authenticated_bypass(self):
+        client = APIClient()
+        client.force_authenticate(self.author)
+        self.get()
+        self.assertNotIn('X-Cache', client.get(URL))
+
+    def test_stats(self):
+        self.get()
+        self.get()
+        admin = APIClient()
+        admin.force_authenticate(create_user('admin', is_staff=True))
+        response = admin.get(f'{URL}cache_stats/')
+        self.assertEqual(response.data['hits'], 1)
+        self.assertEqual(response.data['misses'], 1)
+
+    def test_recipe_create(self):
+        self.get()
+        with self.captureOnCommitCallbacks(execute=True):
+            create_recipes(self.author, 1, self.tags)
+        self.assert_refreshed(
+            lambda results: self.assertEqual(len(results), 4))
+
+    def test_recipe_edit(self):
+        self.get()
+        recipe = self.recipes[0]
+        recipe.name = 'renamed'
+        with self.captureOnCommitCallbacks(execute=True):
+            recipe.save()
+        self.assert_refreshed(lambda results: self.assertIn(
+            'renamed', [result['name'] for result in results]))
+
+    def test_recipe_delete(self):
+        self.get()
+        with self.captureOnCommitCallbacks(execute=True):
+            Recipe.objects.filter(pk=self.recipes[0].pk).delete()
+        self.assert_refreshed(lambda results: self.assertNotIn(
+            self.recipes[0].pk, [result['id'] for result in results]))
+
+    def test_tag_rename(self):
+        self.get({'tags': 'tag-0'})
+        self.tags[0].name = 'renamed'
+        self.tags[0].save()
+        self.assert_refreshed(lambda results: self.assertIn(
+            'renamed', [tag['name'] for tag in results[0]['tags']]),
+            {'tags': 'tag-0'})
+
+    def test_ingredient_rename(self):
+        self.get()
+        self.ingredient.name = 'renamed'
+        self.ingredient.save()
+        self.assert_refreshed(lambda results: self.assertEqual(
+            results[0]['ingredients'][0]['name'], 'renamed'))
+
+    def test_profile_edit(self):
+        self.get()
+        self.author.first_name = 'Renamed'
+        self.author.save()
+        self.assert_refreshed(lambda results: self.assertEqual(
+            results[0]['author']['first_name'], 'Renamed'))
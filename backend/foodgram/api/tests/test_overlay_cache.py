@@ -0,0 +1,117 @@
+from unittest import mock
+
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from rest_framework.test import APIClient
+
+from api.views import RecipeViewSet
+from recipes.models import Favorite, Recipe, ShoppingCart, Subscription
+from .base import (TEST_SETTINGS, create_ingredients, create_recipes,
+                   create_tags, create_user)
+
+URL = '/api/recipes/'
+
+
+@override_settings(**TEST_SETTINGS)
+class UserOverlayCacheTest(TestCase):
+    """Общий кэш представлений рецептов для авторизованных:
+    попадания, персональные флаги и сброс после изменений."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.tags = create_tags(2)
+        cls.ingredient, = create_ingredients(1)
+        cls.author = create_user('author')
+        cls.recipes = create_recipes(
+            cls.author, 3, cls.tags, [cls.ingredient])
+        cls.recipe = cls.recipes[0]
+        cls.reader = create_user('reader')
+        cls.other = create_user('other')
+        Favorite.objects.create(user=cls.reader, recipe=cls.recipe)
+        ShoppingCart.objects.create(user=cls.reader, recipe=cls.recipe)
+        Subscription.objects.create(user=cls.reader, author=cls.author)
+
+    def setUp(self):
+        cache.clear()
+        self.client = self.login(self.reader)
+
+    @staticmethod
+    def login(user):
+        client = APIClient()
+        client.force_authenticate(user)
+        return client
+
+    def detail(self, client=None):
+        response = (client or self.client).get(f'{URL}{self.recipe.pk}/')
+        self.assertEqual(response.status_code, 200)
+        return response.data
+
+    def test_list_hit(self):
+        self.client.get(URL)
+        # Проверка ETag, страница и флаги пользователя,
+        # без сериализации рецептов.
+        with self.assertNumQueries(5):
+            response = self.client.get(URL)
+        self.assertEqual(len(response.data['results']), 3)
+
+    def test_retrieve_hit(self):
+        cold = self.detail()
+        with self.assertNumQueries(5):
+            self.assertEqual(self.detail(), cold)
+
+    def test_flags_per_user(self):
+        self.detail()
+        own = self.detail()
+        self.assertTrue(own['is_favorited'])
+        self.assertTrue(own['is_in_shopping_cart'])
+        self.assertTrue(own['author']['is_subscribed'])
+        other = self.detail(self.login(self.other))
+        self.assertFalse(other['is_favorited'])
+        self.assertFalse(other['is_in_shopping_cart'])
+        self.assertFalse(other['author']['is_subscribed'])
+        self.assertTrue(self.detail()['is_favorited'])
+
+    def test_recipe_edit(self):
+        self.detail()
+        self.recipe.name = 'renamed'
+        self.recipe.save()
+        self.assertEqual(self.detail()['name'], 'renamed')
+
+    def test_tag_rename(self):
+        self.detail()
+        self.tags[0].name = 'renamed'
+        self.tags[0].save()
+        self.assertIn(
+            'renamed', [tag['name'] for tag in self.detail()['tags']])
+
+    def test_ingredient_rename(self):
+        self.detail()
+        self.ingredient.name = 'renamed'
+        self.ingredient.save()
+        self.assertEqual(
+            self.detail()['ingredients'][0]['name'], 'renamed')
+
+    def test_profile_edit(self):
+        self.detail()
+        self.author.first_name = 'Renamed'
+        self.author.save()
+        self.assertEqual(self.detail()['author']['first_name'], 'Renamed')
+
+    def test_recipe_delete(self):
+        self.client.get(URL)
+        Recipe.objects.filter(pk=self.recipe.pk).delete()
+        response = self.client.get(URL)
+        self.assertNotIn(
+            self.recipe.pk, [row['id'] for row in response.data['results']])
+        self.assertEqual(
+            self.client.get(f'{URL}{self.recipe.pk}/').status_code, 404)
+
+    def test_deleted_between_queries(self):
+        with mock.patch.object(
+                RecipeViewSet, 'get_shared_queryset',
+                lambda self, pks: Recipe.objects.none()):
+            response = self.client.get(f'{URL}{self.recipe.pk}/')
+            self.assertEqual(response.status_code, 404)
+            response = self.client.get(URL)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['results'], [])
@@ -0,0 +1,431 @@
+import base64
+import os
+import re
+from collections import Counter
+from urllib.parse import urlsplit
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.db import connection, transaction
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import URLResolver, get_resolver, resolve, reverse
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from recipes.counters import COUNTERS, reconcile_counter
+from recipes.models import (Favorite,
+                            ImageUpload,
+                            Ingredient,
+                            Recipe,
+                            RecipeIngredient,
+                            ShoppingCart,
+                            ShoppingListItem,
+                            Subscription,
+                            Tag)
+from .base import PNG, TEST_SETTINGS
+
+User = get_user_model()
+
+SIZES = (1, 5, 20)
+LITERALS = re.compile(r"'(?:[^']|'')*'|\b\d+\b")
+VALUE_LISTS = re.compile(r'\((?:\?, )+\?\)')
+SAMPLE_KWARGS = {
+    'token': '00000000-0000-0000-0000-000000000000',
+}
+
+
+def normalize(sql):
+    """SQL без значений: одинаковые запросы с разными id совпадают."""
+    return VALUE_LISTS.sub('(...)', LITERALS.sub('?', sql))
+
+
+def api_routes(resolver=None, prefix=''):
+    """Имена маршрутов API, до которых доходит запрос.
+    Маршруты, перекрытые другими (например, djoser `users/activation/`
+    перекрыт `users/<pk>/`), пропускаются."""
+    resolver = resolver or get_resolver()
+    names = set()
+    for pattern in resolver.url_patterns:
+        if isinstance(pattern, URLResolver):
+            names |= api_routes(pattern, prefix + str(pattern.pattern))
+            continue
+        groups = pattern.pattern.regex.groupindex
+        if not prefix.startswith('api/') or not pattern.name:
+            continue
+        if 'format' in groups:
+            continue
+        kwargs = {name: SAMPLE_KWARGS.get(name, '1') for name in groups}
+        path = reverse(pattern.name, kwargs=kwargs)
+        if resolve(path).url_name == pattern.name:
+            names.add(pattern.name)
+    return names
+
+
+PASSWORD = 'Budget-pass-12345'
+NEW_PASSWORD = 'Budget-pass-54321'
+PNG_URI = 'data:image/png;base64,' + base64.b64encode(PNG).decode()
+
+
+class Fixture:
+    """Данные, в которых размер `n` задает число строк в ответе:
+    у автора `authors[n]` n рецептов по n ингредиентов, у читателя
+    `readers[n]` они же в избранном и корзине и n подписок.
+    `viewer` - читатель с наибольшим набором для постраничных списков."""
+
+    def __init__(self, sizes):
+        top = max(sizes)
+        self.password = make_password(PASSWORD)
+        self.image = Recipe._meta.get_field('image').storage.save(
+            'recipes/budget.png', ContentFile(PNG))
+        with transaction.atomic():
+            self.tags = [
+                Tag.objects.create(
+                    name=f'budget-{i}', color=f'#00000{i}',
+                    slug=f'budget-{i}')
+                for i in range(3)
+            ]
+            Ingredient.objects.bulk_create(
+                Ingredient(name=f'budget-{i:03}', measurement_unit='г')
+                for i in range(top + 1))
+            self.ingredients = list(Ingredient.objects.filter(
+                name__startswith='budget-').order_by('name'))
+            self.staff = self.user('staff', is_staff=True)
+            self.extras = [self.user(f'extra-{i}') for i in range(2 * top)]
+            self.pool = []
+            for extra in self.extras:
+                self.pool += self.recipes(extra, 2, 2)
+            self.authors, self.own, self.spare, self.readers = {}, {}, {}, {}
+            for n in sizes:
+                author = self.authors[n] = self.user(f'author-{n}')
+                self.own[n] = self.recipes(author, n, n)
+                self.spare[n] = self.recipes(author, 1, n)[0]
+                reader = self.readers[n] = self.user(f'reader-{n}')
+                for model in (Favorite, ShoppingCart):
+                    model.objects.bulk_create(
+                        model(user=reader, recipe=recipe)
+                        for recipe in self.own[n])
+                Subscription.objects.bulk_create(
+                    Subscription(user=reader, author=extra)
+                    for extra in self.extras[:n])
+            self.viewer = self.readers[top]
+            ShoppingListItem.objects.rebuild()
+            for model in COUNTERS:
+                reconcile_counter(model)
+
+    def user(self, name, **fields):
+        return User.objects.create(
+            username=f'budget-{name}', email=f'budget-{name}@example.com',
+            first_name='Budget', last_name=name, password=self.password,
+            **fields)
+
+    def recipes(self, author, count, ingredients):
+        recipes = [
+            Recipe.objects.create(
+                author=author, name=f'{author.username}-{i}', text='budget',
+                cooking_time=1, image=self.image)
+            for i in range(count)
+        ]
+        for recipe in recipes:
+            recipe.tags.set(self.tags)
+        RecipeIngredient.objects.bulk_create(
+            RecipeIngredient(recipe=recipe, ingredient=ingredient, amount=1)
+            for recipe in recipes
+            for ingredient in self.ingredients[:ingredients])
+        return recipes
+
+    def recipe_data(self, n):
+        return {
+            'name': f'budget-new-{n}',
+            'text': 'budget',
+            'cooking_time': 1,
+            'image': PNG_URI,
+            'tags': [tag.id for tag in self.tags],
+            'ingredients': [
+                {'id': ingredient.id, 'amount': 2}
+                for ingredient in self.ingredients[1:n + 1]
+            ],
+        }
+
+    def upload(self, n, received=0):
+        """Сеанс загрузки читателя `n`, готовый к записи или завершению."""
+        upload = ImageUpload.objects.create(
+            user=self.readers[n], size=len(PNG), received=received)
+        os.makedirs(os.path.dirname(upload.path), exist_ok=True)
+        with open(upload.path, 'wb') as file:
+            file.write(PNG[:received])
+        self.last_upload = upload
+        return upload
+
+    def token(self, n):
+        Token.objects.get_or_create(user=self.readers[n])
+
+
+class Case:
+    """Запрос к маршруту API. `path`, `user` и `data` -
+    значения или функции от данных и размера `n`.
+    `budget` - наибольшее допустимое число запросов."""
+
+    def __init__(self, name, method, path, budget, user=None, status=200,
+                 data=None, prepare=None, content_type=None, headers=None):
+        self.name = name
+        self.method = method
+        self.path = path
+        self.budget = budget
+        self.user = user
+        self.status = status
+        self.data = data
+        self.prepare = prepare
+        self.content_type = content_type
+        self.headers = headers or {}
+
+    def resolve(self, value, fixture, n):
+        return value(fixture, n) if callable(value) else value
+
+
+def viewer(fx, n):
+    return fx.viewer
+
+
+def reader(fx, n):
+    return fx.readers[n]
+
+
+def author(fx, n):
+    return fx.authors[n]
+
+
+def own_ids(fx, n):
+    return {'ids': [recipe.id for recipe in fx.own[n]]}
+
+
+def pool_ids(fx, n):
+    return {'ids': [recipe.id for recipe in fx.pool[:n]]}
+
+
+# Постраничные списки без фильтров на PostgreSQL делают еще один
+# запрос к pg_class за оценкой числа строк, их бюджет на запрос больше.
+# Внутри транзакции теста в бюджет входят SAVEPOINT и RELEASE.
+CASES = [
+    Case('api root', 'get', '/api/', 0),
+    Case('tags', 'get', '/api/tags/', 1),
+    Case('tag', 'get', lambda fx, n: f'/api/tags/{fx.tags[0].id}/', 1),
+    Case('ingredients search', 'get', '/api/ingredients/?name=budget', 1),
+    Case('ingredient', 'get',
+         lambda fx, n: f'/api/ingredients/{fx.ingredients[0].id}/', 1),
+
+    Case('recipes anonymous', 'get', lambda fx, n: f'/api/recipes/?limit={n}',
+         5),
+    Case('recipes', 'get', lambda fx, n: f'/api/recipes/?limit={n}', 10,
+         user=viewer),
+    Case('recipes filtered', 'get',
+         lambda fx, n: (f'/api/recipes/?limit={n}&tags=budget-0'
+                        f'&tags=budget-1&is_favorited=1'
+                        f'&is_in_shopping_cart=1'), 11,
+         user=viewer),
+    Case('recipes by author', 'get',
+         lambda fx, n: (f'/api/recipes/?limit={n}'
+                        f'&author={fx.authors[max(fx.authors)].id}'),
+         9, user=viewer),
+    Case('recipes cursor', 'get',
+         lambda fx, n: f'/api/recipes/?limit={n}&cursor=', 8, user=viewer),
+    Case('recipe anonymous', 'get',
+         lambda fx, n: f'/api/recipes/{fx.own[n][0].id}/', 4),
+    Case('recipe', 'get',
+         lambda fx, n: f'/api/recipes/{fx.own[n][0].id}/', 8, user=reader),
+    Case('recipe create', 'post', '/api/recipes/', 15, user=reader,
+         status=201, data=lambda fx, n: fx.recipe_data(n)),
+    Case('recipe update', 'patch',
+         lambda fx, n: f'/api/recipes/{fx.own[n][0].id}/', 21, user=author,
+         data=lambda fx, n: {
+             'ingredients': [
+                 {'id': ingredient.id, 'amount': 2}
+                 for ingredient in fx.ingredients[:n + 1]
+             ],
+             'tags': [fx.tags[0].id],
+         }),
+    Case('recipe delete', 'delete',
+         lambda fx, n: f'/api/recipes/{fx.spare[n].id}/', 11, user=author,
+         status=204),
+
+    Case('favorite add', 'post',
+         lambda fx, n: f'/api/recipes/{fx.spare[n].id}/favorite/', 6,
+         user=reader, status=201),
+    Case('favorite remove', 'delete',
+         lambda fx, n: f'/api/recipes/{fx.own[n][0].id}/favorite/', 5,
+         user=reader, status=204),
+    Case('shopping cart add', 'post',
+         lambda fx, n: f'/api/recipes/{fx.spare[n].id}/shopping_cart/', 11,
+         user=reader, status=201),
+    Case('shopping cart remove', 'delete',
+         lambda fx, n: f'/api/recipes/{fx.own[n][0].id}/shopping_cart/', 9,
+         user=reader, status=204),
+    Case('bulk favorite add', 'post', '/api/recipes/bulk_favorite/', 7,
+         user=reader, data=pool_ids),
+    Case('bulk favorite remove', 'delete', '/api/recipes/bulk_favorite/',
+         7, user=reader, data=own_ids),
+    Case('bulk shopping cart add', 'post',
+         '/api/recipes/bulk_shopping_cart/', 12, user=reader, data=pool_ids),
+    Case('bulk shopping cart remove', 'delete',
+         '/api/recipes/bulk_shopping_cart/', 11, user=reader, data=own_ids),
+    Case('download shopping cart', 'get',
+         '/api/recipes/download_shopping_cart/', 1, user=reader),
+    Case('shopping list', 'get', '/api/recipes/shopping_list/', 1,
+         user=reader),
+    Case('cache stats', 'get', '/api/recipes/cache_stats/', 0,
+         user=lambda fx, n: fx.staff),
+
+    Case('users anonymous', 'get', lambda fx, n: f'/api/users/?limit={n}', 3),
+    Case('users', 'get', lambda fx, n: f'/api/users/?limit={n}', 3,
+         user=viewer),
+    Case('user', 'get', lambda fx, n: f'/api/users/{fx.authors[n].id}/', 1,
+         user=viewer),
+    Case('me', 'get', '/api/users/me/', 1, user=reader),
+    Case('user create', 'post', '/api/users/', 4, status=201,
+         data=lambda fx, n: {
+             'email': f'budget-new-{n}@example.com',
+             'username': f'budget-new-{n}',
+             'first_name': 'Budget',
+             'last_name': 'New',
+             'password': PASSWORD,
+         }),
+    Case('set password', 'post', '/api/users/set_password/', 1,
+         user=reader, status=204,
+         data={'current_password': PASSWORD, 'new_password': NEW_PASSWORD}),
+    Case('subscriptions', 'get',
+         lambda fx, n: f'/api/users/subscriptions/?limit={n}', 3,
+         user=viewer),
+    Case('subscriptions with recipes limit', 'get',
+         lambda fx, n: (f'/api/users/subscriptions/?limit={n}'
+                        f'&recipes_limit=1'), 3,
+         user=viewer),
+    Case('subscribe', 'post',
+         lambda fx, n: (f'/api/users/{fx.authors[n].id}/subscribe/'
+                        f'?recipes_limit=1'), 9,
+         user=reader, status=201),
+    Case('unsubscribe', 'delete',
+         lambda fx, n: f'/api/users/{fx.extras[0].id}/subscribe/', 7,
+         user=reader, status=204),
+    Case('bulk subscribe', 'post', '/api/users/bulk_subscribe/', 7,
+         user=reader,
+         data=lambda fx, n: {'ids': [
+             extra.id for extra in fx.extras[len(fx.extras) // 2:][:n]]}),
+    Case('bulk unsubscribe', 'delete', '/api/users/bulk_subscribe/', 7,
+         user=reader,
+         data=lambda fx, n: {'ids': [extra.id for extra in fx.extras[:n]]}),
+
+    Case('token login', 'post', '/api/auth/token/login/', 6,
+         data=lambda fx, n: {'email': fx.readers[n].email,
+                             'password': PASSWORD}),
+    Case('token logout', 'post', '/api/auth/token/logout/', 1, user=reader,
+         status=204, prepare=lambda fx, n: fx.token(n)),
+
+    Case('upload create', 'post', '/api/uploads/', 3, user=reader,
+         status=201, data={'size': len(PNG)}),
+    Case('upload status', 'get',
+         lambda fx, n: f'/api/uploads/{fx.last_upload.token}/', 1,
+         user=reader, prepare=lambda fx, n: fx.upload(n)),
+    Case('upload chunk', 'put',
+         lambda fx, n: f'/api/uploads/{fx.last_upload.token}/', 5,
+         user=reader, prepare=lambda fx, n: fx.upload(n),
+         data=PNG, content_type='application/octet-stream',
+         headers={'HTTP_CONTENT_RANGE':
+                  f'bytes 0-{len(PNG) - 1}/{len(PNG)}'}),
+    Case('upload complete', 'post',
+         lambda fx, n: f'/api/uploads/{fx.last_upload.token}/complete/', 2,
+         user=reader, prepare=lambda fx, n: fx.upload(n, len(PNG))),
+]
+
+
+def duplicates(queries):
+    """Повторяющиеся запросы, самые частые первыми."""
+    repeated = Counter(normalize(query['sql']) for query in queries)
+    return '\n'.join(
+        f'  {times} x {sql}'
+        for sql, times in repeated.most_common() if times > 1)
+
+
+@override_settings(**TEST_SETTINGS)
+class QueryBudgetTest(TestCase):
+    """Число SQL-запросов маршрутов API. Каждый запрос выполняется
+    для нескольких размеров данных: число запросов не должно расти
+    с размером и превышать бюджет сценария. При нарушении
+    в сообщении перечислены повторяющиеся запросы."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.fixture = Fixture(SIZES)
+
+    def measure(self, case, n):
+        """Выполняет запрос в транзакции, которая затем откатывается,
+        поэтому каждый запрос видит одни и те же данные."""
+        client = APIClient()
+        user = case.resolve(case.user, self.fixture, n)
+        if user is not None:
+            client.force_authenticate(user)
+        cache.clear()
+        with transaction.atomic():
+            if case.prepare:
+                case.prepare(self.fixture, n)
+            path = case.resolve(case.path, self.fixture, n)
+            data = case.resolve(case.data, self.fixture, n)
+            kwargs = dict(case.headers)
+            if case.content_type:
+                kwargs['content_type'] = case.content_type
+            elif data is not None:
+                kwargs['format'] = 'json'
+            with CaptureQueriesContext(connection) as queries:
+                response = getattr(client, case.method)(path, data, **kwargs)
+                if response.streaming:
+                    b''.join(response.streaming_content)
+            transaction.set_rollback(True)
+        return path, response, queries.captured_queries
+
+    def check_case(self, case):
+        counts = {}
+        for n in SIZES:
+            with self.subTest(case.name, size=n):
+                path, response, queries = self.measure(case, n)
+                body = b'' if response.streaming else response.content
+                self.assertEqual(
+                    response.status_code, case.status,
+                    f'{path}: {body[:300]}')
+                counts[n] = len(queries)
+                self.assertLessEqual(
+                    counts[n], case.budget,
+                    f'превышен бюджет\n{duplicates(queries)}')
+        if len(counts) == len(SIZES):
+            with self.subTest(case.name, sizes=SIZES):
+                self.assertLessEqual(
+                    counts[SIZES[-1]], counts[SIZES[0]],
+                    f'растет с размером: {counts}\n{duplicates(queries)}')
+
+    def test_budgets(self):
+        for case in CASES:
+            self.check_case(case)
+
+    def test_all_routes_checked(self):
+        covered = set()
+        for case in CASES:
+            with transaction.atomic():
+                if case.prepare:
+                    case.prepare(self.fixture, SIZES[0])
+                path = case.resolve(case.path, self.fixture, SIZES[0])
+                covered.add(resolve(urlsplit(path).path).url_name)
+                transaction.set_rollback(True)
+        self.assertEqual(api_routes() - covered, set())
+
+    def test_recipes_limit(self):
+        """Ограничение рецептов авторов в подписках делается одним
+        запросом с ROW_NUMBER(), поэтому проверяем и результат."""
+        client = APIClient()
+        client.force_authenticate(self.fixture.viewer)
+        response = client.get(
+            '/api/users/subscriptions/?limit=20&recipes_limit=1')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data['results']), max(SIZES))
+        for author in response.data['results']:
+            self.assertEqual(author['recipes_count'], 2)
+            self.assertEqual(len(author['recipes']), 1)
@@ -0,0 +1,111 @@
+from itertools import product
+
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from rest_framework.test import APIClient
+
+from recipes.models import Favorite, ShoppingCart
+from .base import TEST_SETTINGS, create_recipes, create_tags, create_user
+
+FLAGS = (None, '0', '1')
+
+
+@override_settings(**TEST_SETTINGS)
+class RecipeFilterTest(TestCase):
+    """Фильтры `is_favorited` и `is_in_shopping_cart` вместе
+    с тегами, автором и постраничным выводом."""
+
+    @classmethod
+    def setUpTestData(cls):
+        tags = create_tags(3)
+        cls.reader = create_user('reader')
+        cls.authors = [create_user(f'author-{i}') for i in range(3)]
+        cls.facts = {}
+        for i in range(12):
+            recipe_tags = {tags[i % 3], tags[(i + i % 2) % 3]}
+            recipe, = create_recipes(cls.authors[i % 3], 1, recipe_tags)
+            favorited, in_cart = i % 2 == 0, i % 3 == 0
+            if favorited:
+                Favorite.objects.create(user=cls.reader, recipe=recipe)
+            if in_cart:
+                ShoppingCart.objects.create(user=cls.reader, recipe=recipe)
+            cls.facts[recipe.id] = {
+                'author': recipe.author_id,
+                'tags': {tag.slug for tag in recipe_tags},
+                'is_favorited': favorited,
+                'is_in_shopping_cart': in_cart,
+            }
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.client.force_authenticate(self.reader)
+
+    def expected(self, params, anonymous=False):
+        ids = set()
+        for pk, facts in self.facts.items():
+            if params.get('author') not in (None, facts['author']):
+                continue
+            if params['tags'] and not facts['tags'] & set(params['tags']):
+                continue
+            flags = [
+                (value, False if anonymous else facts[name])
+                for name, value in params.items()
+                if name.startswith('is_') and value is not None
+            ]
+            if all(bool(int(value)) == fact for value, fact in flags):
+                ids.add(pk)
+        return ids
+
+    def walk(self, client, params, limit=3, cursor=False):
+        """Все рецепты по ссылкам `next`, начиная с первой страницы."""
+        query = {name: value for name, value in params.items()
+                 if value is not None}
+        query['limit'] = limit
+        if cursor:
+            query['cursor'] = ''
+        response = client.get('/api/recipes/', query)
+        results = []
+        while True:
+            self.assertEqual(response.status_code, 200)
+            self.assertLessEqual(len(response.data['results']), limit)
+            results += response.data['results']
+            if not response.data['next']:
+                return response, results
+            response = client.get(response.data['next'])
+
+    def combinations(self):
+        for favorited, in_cart, tags, author in product(
+                FLAGS, FLAGS, ([], ['tag-0'], ['tag-0', 'tag-1']),
+                (None, self.authors[1].id)):
+            yield {
+                'is_favorited': favorited,
+                'is_in_shopping_cart': in_cart,
+                'tags': tags,
+                'author': author,
+            }
+
+    def test_authenticated(self):
+        for params, cursor in product(self.combinations(), (False, True)):
+            with self.subTest(cursor=cursor, **params):
+                response, results = self.walk(self.client, params,
+                                              cursor=cursor)
+                ids = [recipe['id'] for recipe in results]
+                self.assertEqual(len(ids), len(set(ids)))
+                self.assertEqual(set(ids), self.expected(params))
+                if not cursor:
+                    self.assertEqual(response.data['count'], len(ids))
+                for recipe in results:
+                    facts = self.facts[recipe['id']]
+                    for name in ('is_favorited', 'is_in_shopping_cart'):
+                        self.assertEqual(recipe[name], facts[name])
+
+    def test_anonymous(self):
+        for params in self.combinations():
+            with self.subTest(**params):
+                response, results = self.walk(APIClient(), params)
+                ids = [recipe['id'] for recipe in results]
+                self.assertEqual(len(ids), len(set(ids)))
+                self.assertEqual(
+                    set(ids), self.expected(params, anonymous=True))
+                self.assertEqual(response.data['count'], len(ids))
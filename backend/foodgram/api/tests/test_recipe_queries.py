@@ -0,0 +1,73 @@
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from rest_framework.test import APIClient
+
+from recipes.models import Favorite, ShoppingCart, Subscription
+from .base import (TEST_SETTINGS, create_ingredients, create_recipes,
+                   create_tags, create_user, estimate_queries)
+
+SIZES = (1, 5, 20)
+
+
+@override_settings(**TEST_SETTINGS)
+class RecipeQueriesTest(TestCase):
+    """Число запросов списка и страницы рецепта не зависит
+    от размера страницы и числа ингредиентов рецепта."""
+
+    @classmethod
+    def setUpTestData(cls):
+        tags = create_tags(3)
+        ingredients = create_ingredients(max(SIZES))
+        cls.reader = create_user('reader')
+        authors = [create_user(f'author-{i}') for i in range(4)]
+        recipes = []
+        for author in authors:
+            recipes += create_recipes(author, 5, tags, ingredients[:5])
+        cls.detailed = {
+            n: create_recipes(authors[0], 1, tags, ingredients[:n])[0]
+            for n in SIZES
+        }
+        Favorite.objects.bulk_create(
+            Favorite(user=cls.reader, recipe=recipe)
+            for recipe in recipes[::2])
+        ShoppingCart.objects.bulk_create(
+            ShoppingCart(user=cls.reader, recipe=recipe)
+            for recipe in recipes[::3])
+        Subscription.objects.bulk_create(
+            Subscription(user=cls.reader, author=author)
+            for author in authors[::2])
+
+    def setUp(self):
+        self.anonymous = APIClient()
+        self.client = APIClient()
+        self.client.force_authenticate(self.reader)
+
+    def assert_list_queries(self, client, expected):
+        for n in SIZES:
+            with self.subTest(limit=n):
+                cache.clear()
+                with self.assertNumQueries(expected + estimate_queries()):
+                    response = client.get(f'/api/recipes/?limit={n}')
+                self.assertEqual(response.status_code, 200)
+                self.assertEqual(len(response.data['results']), n)
+
+    def assert_retrieve_queries(self, client, expected):
+        for n, recipe in self.detailed.items():
+            with self.subTest(ingredients=n):
+                cache.clear()
+                with self.assertNumQueries(expected):
+                    response = client.get(f'/api/recipes/{recipe.id}/')
+                self.assertEqual(response.status_code, 200)
+                self.assertEqual(len(response.data['ingredients']), n)
+
+    def test_list_anonymous(self):
+        self.assert_list_queries(self.anonymous, 4)
+
+    def test_list_authenticated(self):
+        self.assert_list_queries(self.client, 9)
+
+    def test_retrieve_anonymous(self):
+        self.assert_retrieve_queries(self.anonymous, 4)
+
+    def test_retrieve_authenticated(self):
+        self.assert_retrieve_queries(self.client, 8)
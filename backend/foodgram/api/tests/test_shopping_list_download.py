@@ -0,0 +1,158 @@
+import csv
+import json
+from io import BytesIO, StringIO
+
+from django.conf import settings
+from django.test import TestCase, override_settings
+from pypdf import PdfReader
+from rest_framework.test import APIClient
+
+from api.fonts import TrueTypeFont, checksum
+from api.renderers import TITLE, PdfShoppingListRenderer
+from recipes.models import Ingredient, ShoppingCart, ShoppingListItem
+from .base import TEST_SETTINGS, create_recipes, create_user
+
+CONTENT_TYPES = {
+    'txt': 'text/plain; charset=utf-8',
+    'csv': 'text/csv; charset=utf-8',
+    'json': 'application/json; charset=utf-8',
+    'pdf': 'application/pdf',
+}
+URL = '/api/recipes/download_shopping_cart/'
+
+
+@override_settings(**TEST_SETTINGS)
+class ShoppingListDownloadTest(TestCase):
+    """Выгрузка списка покупок во всех форматах. Строк больше,
+    чем помещается на страницу PDF, в названиях есть кириллица."""
+
+    @classmethod
+    def setUpTestData(cls):
+        Ingredient.objects.bulk_create(
+            Ingredient(name=f'Ёжевика №{i:03}', measurement_unit='шт.')
+            for i in range(120))
+        ingredients = list(Ingredient.objects.all())
+        cls.user = create_user('reader')
+        recipe, = create_recipes(create_user('author'), 1, (), ingredients)
+        ShoppingCart.objects.create(user=cls.user, recipe=recipe)
+        ShoppingListItem.objects.rebuild()
+        cls.rows = [
+            (ingredient.name, 1, ingredient.measurement_unit)
+            for ingredient in ingredients
+        ]
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def download(self, fmt, client=None):
+        response = (client or self.client).get(URL, {'format': fmt})
+        content = b''.join(response.streaming_content)
+        return response, content
+
+    def test_headers(self):
+        for fmt, content_type in CONTENT_TYPES.items():
+            with self.subTest(fmt):
+                response, _ = self.download(fmt)
+                self.assertEqual(response.status_code, 200)
+                self.assertEqual(response['Content-Type'], content_type)
+                self.assertTrue(
+                    response['Content-Disposition'].endswith(f'.{fmt}'))
+
+    def test_txt(self):
+        _, content = self.download('txt')
+        self.assertEqual(
+            content.decode().splitlines(),
+            [f'{TITLE}:'] + [f'{name} - {amount} {unit}'
+                             for name, amount, unit in self.rows])
+
+    def test_csv(self):
+        _, content = self.download('csv')
+        rows = list(csv.reader(StringIO(content.decode())))
+        self.assertEqual(rows[0], ['name', 'amount', 'measurement_unit'])
+        self.assertEqual(
+            rows[1:], [[name, str(amount), unit]
+                       for name, amount, unit in self.rows])
+
+    def test_json(self):
+        _, content = self.download('json')
+        self.assertEqual(json.loads(content), [
+            {'name': name, 'amount': amount, 'measurement_unit': unit}
+            for name, amount, unit in self.rows
+        ])
+
+    def test_pdf(self):
+        _, content = self.download('pdf')
+        reader = PdfReader(BytesIO(content), strict=True)
+        renderer = PdfShoppingListRenderer
+        per_page = ((renderer.page_size[1] - 2 * renderer.margin)
+                    // renderer.line_height)
+        self.assertEqual(
+            len(reader.pages), -(-(len(self.rows) + 1) // per_page))
+        lines = []
+        for page in reader.pages:
+            lines += page.extract_text().splitlines()
+        self.assertEqual(
+            lines,
+            [f'{TITLE}:'] + [f'{name} - {amount} {unit}'
+                             for name, amount, unit in self.rows])
+
+    def test_empty_pdf(self):
+        ShoppingListItem.objects.filter(user=self.user).delete()
+        _, content = self.download('pdf')
+        reader = PdfReader(BytesIO(content), strict=True)
+        self.assertEqual(len(reader.pages), 1)
+        self.assertEqual(
+            reader.pages[0].extract_text().strip(), f'{TITLE}:')
+
+    def test_errors_are_json(self):
+        for fmt in CONTENT_TYPES:
+            with self.subTest(fmt):
+                response = APIClient().get(URL, {'format': fmt})
+                self.assertEqual(response.status_code, 401)
+                self.assertEqual(
+                    response['Content-Type'],
+                    'application/json; charset=utf-8')
+                self.assertIn('detail', json.loads(response.content))
+
+
+class FontSubsetTest(TestCase):
+    """Подмножество шрифта, встраиваемое в PDF."""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.font = TrueTypeFont(settings.SHOPPING_CART_FONT)
+
+    def test_subset(self):
+        glyphs = {self.font.glyph(char) for char in 'Ёжевика №0123 йЁ'}
+        subset = TrueTypeFont.__new__(TrueTypeFont)
+        data = self.font.subset(glyphs)
+        self.assertEqual(checksum(data), 0xB1B0AFBA)
+        subset.data = data
+        subset.tables = {}
+        count = int.from_bytes(data[4:6], 'big')
+        for number in range(count):
+            entry = data[12 + 16 * number:28 + 16 * number]
+            tag = entry[:4]
+            table_checksum, offset, length = (
+                int.from_bytes(entry[i:i + 4], 'big') for i in (4, 8, 12))
+            subset.tables[tag] = (offset, length)
+            if tag != b'head':
+                self.assertEqual(
+                    checksum(data[offset:offset + length]), table_checksum)
+        loca = subset.table(b'loca')
+        subset.loca = [
+            int.from_bytes(loca[i:i + 4], 'big')
+            for i in range(0, len(loca), 4)
+        ]
+        kept = set()
+        pending = [0, *glyphs]
+        while pending:
+            glyph = pending.pop()
+            if glyph not in kept:
+                kept.add(glyph)
+                pending.extend(self.font.components(glyph))
+        for glyph in range(len(self.font.loca) - 1):
+            expected = self.font.glyph_data(glyph) if glyph in kept else b''
+            self.assertEqual(subset.glyph_data(glyph), expected)
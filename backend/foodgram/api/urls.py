@@ -1,7 +1,8 @@
 from django.urls import include, path
 from rest_framework.routers import DefaultRouter
 
-from .views import (IngredientViewSet,
+from .views import (ImageUploadViewSet,
+                    IngredientViewSet,
                     RecipeViewSet,
                     TagViewSet,
                     UserViewSet,
@@ -13,6 +14,7 @@ router.register('tags', TagViewSet)
 router.register('ingredients', IngredientViewSet)
 router.register('recipes', RecipeViewSet)
 router.register('users', UserViewSet)
+router.register('uploads', ImageUploadViewSet, basename='uploads')
 
 urlpatterns = [
     path('users/<int:user_id>/subscribe/', AddAndDeleteSubscribe.as_view(),
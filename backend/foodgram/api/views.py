@@ -1,9 +1,25 @@
+import os
+import re
+from datetime import timedelta
+
+from django.conf import settings
 from django.contrib.auth import get_user_model
-from django.db.models import Sum
+from django.contrib.auth.models import AnonymousUser
+from django.db import IntegrityError, connection, transaction
+from django.db.models import (BooleanField,
+                              Exists,
+                              F,
+                              Max,
+                              OuterRef,
+                              Prefetch,
+                              Window,
+                              prefetch_related_objects,)
 from django.db.models.aggregates import Count
-from django.db.models.expressions import Value
-from django.http import HttpResponse
+from django.db.models.expressions import RawSQL, Value
+from django.db.models.functions import RowNumber
+from django.http import StreamingHttpResponse
 from django.shortcuts import get_object_or_404
+from django.utils import timezone
 from django_filters.rest_framework import DjangoFilterBackend
 from rest_framework import (exceptions,
                             filters,
@@ -15,12 +31,20 @@ from rest_framework import (exceptions,
 from rest_framework.decorators import action
 from rest_framework.response import Response
 
+from .fields import Base64ImageField
 from .filters import RecipeFilter, IngredientFilter
-from .pagination import PagePagination
+from .mixins import (AnonymousListCacheMixin,
+                     ConditionalGetMixin,
+                     UserOverlayMixin,)
+from .pagination import CachedCountPagination, RecipePagination
 from .permissions import IsAuthorOrAdminPermission
-from .serializers import (IngredientSerializer,
+from .renderers import SHOPPING_LIST_RENDERERS
+from .serializers import (BulkIdsSerializer,
+                          ImageUploadSerializer,
+                          IngredientSerializer,
                           RecipeSerializer,
                           RecipeCreateSerializer,
+                          ShoppingListItemSerializer,
                           SubFavCartRecipeSerializer,
                           SubscriptionSerializer,
                           SubscriptionCreateSerializer,
@@ -28,16 +52,194 @@ from .serializers import (IngredientSerializer,
                           UserCreateSerializer,
                           UserPasswordSerializer,
                           UserSerializer,)
+from recipes.counters import COUNTERS, change_counter
 from recipes.models import (Favorite,
+                            ImageUpload,
                             Ingredient,
                             Recipe,
                             RecipeIngredient,
                             ShoppingCart,
+                            ShoppingListItem,
+                            Subscription,
                             Tag,)
+from recipes.search import ingredient_index, ranked_search
+from recipes.versions import bump_version, get_versions, user_state
 
 User = get_user_model()
 
-FILE_NAME = 'shopping_cart.txt'
+FILE_NAME = 'shopping_cart'
+SHOPPING_LIST_CHUNK_SIZE = 500
+CONTENT_RANGE = re.compile(r'bytes (\d+)-(\d+)/(\d+)')
+UPLOAD_CHUNK_SIZE = 64 * 1024
+SHORT_RECIPE_FIELDS = ('id', 'name', 'image', 'image_variants', 'cooking_time')
+
+
+def expire_uploads():
+    """Удаляет устаревшие сеансы загрузки и их файлы."""
+    expired = ImageUpload.objects.filter(
+        created__lt=timezone.now() - timedelta(
+            seconds=settings.UPLOAD_SESSION_TTL))
+    for upload in expired:
+        if os.path.exists(upload.path):
+            os.remove(upload.path)
+    expired.delete()
+
+
+def write_range(path, offset, length, stream):
+    """Пишет в файл не больше `length` байт из потока,
+    начиная с `offset`, и возвращает число записанных байт."""
+    written = 0
+    with open(path, 'r+b') as file:
+        file.seek(offset)
+        while written < length:
+            chunk = stream.read(min(UPLOAD_CHUNK_SIZE, length - written))
+            if not chunk:
+                break
+            file.write(chunk)
+            written += len(chunk)
+    return written
+
+
+def delete_user_links(model, field, user_id, target_ids):
+    """DELETE связей пользователя с объектами `target_ids` без
+    предварительного SELECT и сигналов удаления. Возвращает число
+    удаленных строк, поэтому из параллельных запросов удаление
+    засчитывается только одному."""
+    opts = model._meta
+    quote = connection.ops.quote_name
+    placeholders = ', '.join(['%s'] * len(target_ids))
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'DELETE FROM {quote(opts.db_table)} '
+            f'WHERE {quote(opts.get_field("user").column)} = %s '
+            f'AND {quote(opts.get_field(field).column)} '
+            f'IN ({placeholders})',
+            [user_id, *target_ids])
+        return cursor.rowcount
+
+
+def lock_user(user):
+    """Блокирует строку пользователя до конца транзакции,
+    чтобы изменения его связей, итогов списка покупок
+    и счетчиков шли по очереди. Берется во всех путях записи
+    избранного, корзины и подписок: пакетные пути считают
+    изменения по прочитанным под блокировкой связям."""
+    User.objects.select_for_update().filter(pk=user.pk).exists()
+
+
+def apply_bulk(request, model, field, targets,
+               after_add=None, after_remove=None):
+    """Пакетно добавляет (POST) или удаляет (DELETE) связи пользователя
+    с объектами `targets` и возвращает результат по каждому id."""
+    serializer = BulkIdsSerializer(data=request.data)
+    serializer.is_valid(raise_exception=True)
+    ids = list(dict.fromkeys(serializer.validated_data['ids']))
+    user = request.user
+    lookup = {f'{field}_id__in': ids}
+    with transaction.atomic():
+        lock_user(user)
+        existing = set(targets.filter(id__in=ids).values_list(
+            'id', flat=True))
+        linked = set(model.objects.filter(user=user, **lookup).values_list(
+            f'{field}_id', flat=True))
+        if request.method == 'POST':
+            changed = [pk for pk in ids if pk in existing - linked]
+            model.objects.bulk_create(
+                [model(user=user, **{f'{field}_id': pk}) for pk in changed],
+                ignore_conflicts=True)
+            after, delta, done, skipped = after_add, 1, 'created', 'exists'
+        else:
+            changed = [pk for pk in ids if pk in linked]
+            if changed:
+                delete_user_links(model, field, user.id, changed)
+            after, delta, done, skipped = (
+                after_remove, -1, 'deleted', 'missing')
+        if changed and model in COUNTERS:
+            change_counter(model, changed, delta)
+        if changed and after:
+            after(user, changed)
+    if changed:
+        bump_version(user_state(user.id))
+    changed = set(changed)
+    results = []
+    for pk in ids:
+        if pk in changed:
+            result = done
+        elif pk in existing:
+            result = skipped
+        else:
+            result = 'not_found'
+        results.append({'id': pk, 'status': result})
+    return Response({'results': results})
+
+
+def annotate_recipes(queryset, user, prefetch=True):
+    """Добавляет к рецептам флаги текущего пользователя
+    и подгружает автора, теги и ингредиенты.
+    Без `prefetch` подгружается только автор."""
+    if user.is_authenticated:
+        queryset = queryset.annotate(
+            is_favorited=Exists(Favorite.objects.filter(
+                user=user, recipe=OuterRef('pk'))),
+            is_in_shopping_cart=Exists(ShoppingCart.objects.filter(
+                user=user, recipe=OuterRef('pk'))),
+            author_is_subscribed=Exists(Subscription.objects.filter(
+                user=user, author=OuterRef('author'))),
+        )
+    else:
+        false = Value(False, output_field=BooleanField())
+        queryset = queryset.annotate(
+            is_favorited=false,
+            is_in_shopping_cart=false,
+            author_is_subscribed=false,
+        )
+    queryset = queryset.select_related('author')
+    if not prefetch:
+        return queryset
+    return queryset.prefetch_related(
+        'tags',
+        Prefetch('recipes',
+                 queryset=RecipeIngredient.objects.select_related(
+                     'ingredient')),
+    )
+
+
+def prefetch_author_recipes(authors, limit=None):
+    """Подгружает одним запросом первые `limit` рецептов каждого автора."""
+    recipes = Recipe.objects.filter(author__in=authors)
+    if limit:
+        ranked = recipes.annotate(author_rank=Window(
+            expression=RowNumber(),
+            partition_by=F('author_id'),
+            order_by=(F('pub_date').desc(), F('id').desc()),
+        )).values('id', 'author_rank')
+        sql, params = ranked.query.sql_with_params()
+        recipes = Recipe.objects.filter(id__in=RawSQL(
+            f'SELECT id FROM ({sql}) AS ranked WHERE author_rank <= %s',
+            (*params, limit)))
+    prefetch_related_objects(
+        authors, Prefetch('recipes', queryset=recipes.order_by(
+            '-pub_date', '-id')))
+
+
+def get_recipes_limit(request):
+    limit = request.query_params.get('recipes_limit')
+    if limit is None:
+        return None
+    try:
+        return int(limit)
+    except ValueError:
+        raise exceptions.ValidationError(
+            {'recipes_limit': 'Должно быть целым числом.'})
+
+
+def annotate_users(queryset, user):
+    """Добавляет к пользователям признак подписки текущего пользователя."""
+    if user.is_authenticated:
+        return queryset.annotate(is_subscribed=Exists(
+            Subscription.objects.filter(user=user, author=OuterRef('pk'))))
+    return queryset.annotate(
+        is_subscribed=Value(False, output_field=BooleanField()))
 
 
 class UserViewSet(mixins.CreateModelMixin,
@@ -50,19 +252,31 @@ class UserViewSet(mixins.CreateModelMixin,
     Подписка и отписка."""
 
     queryset = User.objects.all()
-    pagination_class = PagePagination
+    pagination_class = CachedCountPagination
     permission_classes = (permissions.AllowAny,)
 
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        if self.action in ('list', 'retrieve', 'me', 'subscriptions',):
+            return annotate_users(queryset, self.request.user)
+        return queryset
+
     def get_serializer_class(self):
         if self.action in ('list', 'retrieve',):
             return UserSerializer
         return UserCreateSerializer
 
+    def get_count_versions(self):
+        if self.action == 'subscriptions':
+            return (user_state(self.request.user.id),)
+        return ('users',)
+
     @action(detail=False, methods=['get'],
             pagination_class=None,
             permission_classes=(permissions.IsAuthenticated,))
     def me(self, request):
-        serializer = UserSerializer(request.user)
+        user = self.get_queryset().get(pk=request.user.pk)
+        serializer = UserSerializer(user, context={'request': request})
         return Response(serializer.data,
                         status=status.HTTP_200_OK)
 
@@ -76,12 +290,22 @@ class UserViewSet(mixins.CreateModelMixin,
         return Response({'detail': 'Пароль изменен!'},
                         status=status.HTTP_204_NO_CONTENT)
 
+    @action(detail=False, methods=('post', 'delete'),
+            permission_classes=(permissions.IsAuthenticated,))
+    def bulk_subscribe(self, request):
+        """Подписка на список авторов или отписка от них."""
+        return apply_bulk(request, Subscription, 'author',
+                          User.objects.exclude(pk=request.user.pk))
+
     @action(detail=False, methods=['get'],
             permission_classes=(permissions.IsAuthenticated,),
-            pagination_class=PagePagination)
+            pagination_class=CachedCountPagination)
     def subscriptions(self, request):
-        queryset = User.objects.filter(following__user=request.user)
+        queryset = self.get_queryset().filter(
+            following__user=request.user
+        ).order_by('id')
         page = self.paginate_queryset(queryset)
+        prefetch_author_recipes(page, get_recipes_limit(request))
         serializer = SubscriptionSerializer(page,
                                             many=True,
                                             context={'request': request})
@@ -96,12 +320,9 @@ class AddAndDeleteSubscribe(generics.RetrieveDestroyAPIView,
 
     def get_queryset(self):
         return self.request.user.follower.select_related(
-            'following'
-        ).prefetch_related(
-            'following__recipe'
+            'author'
         ).annotate(
-            recipes_count=Count('following__recipe'),
-            is_subscribed=Value(True), )
+            is_subscribed=Value(True, output_field=BooleanField()), )
 
     def get_object(self):
         user_id = self.kwargs['user_id']
@@ -115,19 +336,28 @@ class AddAndDeleteSubscribe(generics.RetrieveDestroyAPIView,
             return Response(
                 {'errors': 'На самого себя не подписаться!'},
                 status=status.HTTP_400_BAD_REQUEST)
-        if request.user.follower.filter(author=instance).exists():
-            return Response(
-                {'errors': 'Уже подписан!'},
-                status=status.HTTP_400_BAD_REQUEST)
-        subs = request.user.follower.create(author=instance)
+        with transaction.atomic():
+            lock_user(request.user)
+            if request.user.follower.filter(author=instance).exists():
+                return Response(
+                    {'errors': 'Уже подписан!'},
+                    status=status.HTTP_400_BAD_REQUEST)
+            subs = request.user.follower.create(author=instance)
+        subs = self.get_queryset().get(pk=subs.pk)
+        prefetch_author_recipes([subs.author], get_recipes_limit(request))
         serializer = self.get_serializer(subs)
         return Response(serializer.data, status=status.HTTP_201_CREATED)
 
     def perform_destroy(self, instance):
-        self.request.user.follower.filter(author=instance).delete()
+        with transaction.atomic():
+            lock_user(self.request.user)
+            self.request.user.follower.filter(author=instance).delete()
 
 
-class RecipeViewSet(viewsets.ModelViewSet):
+class RecipeViewSet(ConditionalGetMixin,
+                    AnonymousListCacheMixin,
+                    UserOverlayMixin,
+                    viewsets.ModelViewSet):
     """Отображение рецептов.
     Добавление/удаление в/из избранных и списка покупок.
     Скачивание списка покупок."""
@@ -135,81 +365,220 @@ class RecipeViewSet(viewsets.ModelViewSet):
     queryset = Recipe.objects.all()
     filterset_class = RecipeFilter
     filter_backends = (DjangoFilterBackend,)
-    pagination_class = PagePagination
+    pagination_class = RecipePagination
     permission_classes = (IsAuthorOrAdminPermission,)
+    catalogue_versions = ('tags', 'ingredients', 'profiles',)
+    personalized = True
+    list_cache_prefix = 'recipes'
+    list_cache_params = ('tags', 'author', 'page', 'limit', 'cursor',
+                         'is_favorited', 'is_in_shopping_cart',)
+    list_cache_versions = ('recipes', 'tags', 'ingredients', 'profiles',)
+    overlay_cache_prefix = 'recipe'
+    overlay_cache_versions = ('tags', 'ingredients', 'profiles',)
+
+    def get_etag_parts(self, request, *args, **kwargs):
+        """Список зависит от числа и времени изменения
+        отфильтрованных рецептов, карточка - от времени ее изменения.
+        Для анонимов используется та же версия, что и в кэше страниц."""
+        if self.action == 'retrieve':
+            updated_at = self.get_updated_at(kwargs['pk'])
+            if updated_at is None:
+                return None
+            state = [updated_at]
+        elif request.user.is_anonymous:
+            state = get_versions('recipes')
+        else:
+            state = self.filter_queryset(Recipe.objects.all()).aggregate(
+                last=Max('updated_at'), count=Count('id')).values()
+        return [*super().get_etag_parts(request, *args, **kwargs), *state]
+
+    def get_count_versions(self):
+        if self.request.user.is_anonymous:
+            return ('recipes',)
+        return ('recipes', user_state(self.request.user.id),)
+
+    def get_updated_at(self, pk):
+        if not hasattr(self, '_updated_at'):
+            try:
+                self._updated_at = Recipe.objects.filter(
+                    pk=pk).values_list('updated_at', flat=True).first()
+            except ValueError:
+                self._updated_at = None
+        return self._updated_at
+
+    def get_queryset(self):
+        """Для списка, карточки и изменения рецепта все вложенные данные
+        загружаются фиксированным числом запросов."""
+        queryset = super().get_queryset()
+        if self.action not in ('list', 'retrieve',
+                               'update', 'partial_update',):
+            return queryset
+        # Изменение читает состав рецепта под блокировкой,
+        # а ответ строит по заново загруженным данным.
+        return annotate_recipes(
+            queryset, self.request.user,
+            prefetch=self.action in ('list', 'retrieve',))
 
     def get_serializer_class(self):
         if self.action in ('list', 'retrieve',):
             return RecipeSerializer
         return RecipeCreateSerializer
 
+    def get_overlay_queryset(self):
+        return Recipe.objects.only(
+            'id', 'author_id', 'pub_date', 'updated_at')
+
+    def get_shared_queryset(self, pks):
+        return annotate_recipes(
+            Recipe.objects.filter(pk__in=pks), AnonymousUser())
+
+    def get_overlay_version(self, recipe):
+        return recipe.updated_at.timestamp()
+
+    def apply_overlay(self, request, recipes, representations):
+        """Флаги текущего пользователя: по одному запросу на страницу."""
+        if not recipes:
+            return
+        user = request.user
+        ids = [recipe.pk for recipe in recipes]
+        favorited = set(Favorite.objects.filter(
+            user=user, recipe_id__in=ids).values_list('recipe_id', flat=True))
+        in_shopping_cart = set(ShoppingCart.objects.filter(
+            user=user, recipe_id__in=ids).values_list('recipe_id', flat=True))
+        subscribed = set(Subscription.objects.filter(
+            user=user,
+            author_id__in={recipe.author_id for recipe in recipes},
+        ).values_list('author_id', flat=True))
+        for recipe, data in zip(recipes, representations):
+            data['is_favorited'] = recipe.pk in favorited
+            data['is_in_shopping_cart'] = recipe.pk in in_shopping_cart
+            data['author']['is_subscribed'] = recipe.author_id in subscribed
+
     def perform_create(self, serializer):
         serializer.save(author=self.request.user)
 
+    def get_short_recipe(self, pk):
+        return get_object_or_404(
+            Recipe.objects.only(*SHORT_RECIPE_FIELDS), pk=pk)
+
+    def add_relation(self, model, recipe, message, after_create=None):
+        """Добавляет рецепт пользователю. Повторное добавление,
+        в том числе параллельное, отсекается ограничением уникальности."""
+        user = self.request.user
+        try:
+            with transaction.atomic():
+                lock_user(user)
+                model.objects.create(user=user, recipe=recipe)
+                if after_create:
+                    after_create(user, [recipe.id])
+        except IntegrityError:
+            raise exceptions.ValidationError(message)
+        serializer = SubFavCartRecipeSerializer(
+            recipe, context={'request': self.request})
+        return Response(serializer.data, status=status.HTTP_201_CREATED)
+
+    def remove_relation(self, model, pk, after_delete=None):
+        """Удаляет рецепт у пользователя одним запросом DELETE
+        и возвращает, была ли удалена строка."""
+        user = self.request.user
+        try:
+            recipe_id = int(pk)
+        except ValueError:
+            raise exceptions.NotFound()
+        with transaction.atomic():
+            lock_user(user)
+            deleted = delete_user_links(model, 'recipe', user.id, [recipe_id])
+            if deleted and model in COUNTERS:
+                change_counter(model, [recipe_id], -1)
+            if deleted and after_delete:
+                after_delete(user, [recipe_id])
+        if deleted:
+            bump_version(user_state(user.id))
+        return bool(deleted)
+
     @action(detail=True, methods=('post', 'delete'))
     def favorite(self, request, pk=None):
-        user = self.request.user
-        recipe = get_object_or_404(Recipe, pk=pk)
         if self.request.method == 'POST':
-            if Favorite.objects.filter(user=user, recipe=recipe).exists():
-                raise exceptions.ValidationError(
-                    'Рецепт уже в избранном')
-
-            Favorite.objects.create(user=user, recipe=recipe)
-            serializer = SubFavCartRecipeSerializer(
-                recipe, context={'request': request})
-            return Response(serializer.data, status=status.HTTP_201_CREATED)
+            return self.add_relation(
+                Favorite, self.get_short_recipe(pk),
+                'Рецепт уже в избранном')
 
-        favorite = get_object_or_404(Favorite, user=user, recipe=recipe)
-        favorite.delete()
+        if not self.remove_relation(Favorite, pk):
+            self.get_short_recipe(pk)
+            raise exceptions.NotFound('Рецепта нет в избранном')
         return Response(status=status.HTTP_204_NO_CONTENT)
 
     @action(detail=True, methods=('post', 'delete'))
     def shopping_cart(self, request, pk=None):
-        user = self.request.user
-        recipe = get_object_or_404(Recipe, pk=pk)
         if self.request.method == 'POST':
-            if ShoppingCart.objects.filter(user=user, recipe=recipe).exists():
-                raise exceptions.ValidationError(
-                    'Ингредиенты рецепта уже в списке покупок')
-
-            ShoppingCart.objects.create(user=user, recipe=recipe)
-            serializer = SubFavCartRecipeSerializer(
-                recipe, context={'request': request})
-
-            return Response(serializer.data, status=status.HTTP_201_CREATED)
-
-        if not ShoppingCart.objects.filter(user=user, recipe=recipe).exists():
+            return self.add_relation(
+                ShoppingCart, self.get_short_recipe(pk),
+                'Ингредиенты рецепта уже в списке покупок',
+                ShoppingListItem.objects.add_recipes)
+
+        if not self.remove_relation(
+                ShoppingCart, pk, ShoppingListItem.objects.remove_recipes):
+            self.get_short_recipe(pk)
             raise exceptions.ValidationError(
                 'Рецептов нет в списке покупок')
-
-        shopping_list = get_object_or_404(ShoppingCart,
-                                          user=user,
-                                          recipe=recipe)
-        shopping_list.delete()
         return Response(status=status.HTTP_204_NO_CONTENT)
 
-    @action(detail=False, methods=['get'],
+    @action(detail=False, methods=('post', 'delete'),
             permission_classes=(permissions.IsAuthenticated,))
+    def bulk_favorite(self, request):
+        """Добавление или удаление списка рецептов в избранном."""
+        return apply_bulk(request, Favorite, 'recipe', Recipe.objects.all())
+
+    @action(detail=False, methods=('post', 'delete'),
+            permission_classes=(permissions.IsAuthenticated,))
+    def bulk_shopping_cart(self, request):
+        """Добавление или удаление списка рецептов в списке покупок."""
+        return apply_bulk(
+            request, ShoppingCart, 'recipe', Recipe.objects.all(),
+            ShoppingListItem.objects.add_recipes,
+            ShoppingListItem.objects.remove_recipes)
+
+    @action(detail=False, methods=['get'],
+            permission_classes=(permissions.IsAuthenticated,),
+            renderer_classes=SHOPPING_LIST_RENDERERS)
     def download_shopping_cart(self, request):
         ingredients = (
-            RecipeIngredient.objects
-            .filter(recipe__shopping_recipe__user=request.user)
-            .values('ingredient')
-            .annotate(total_amount=Sum('amount'))
-            .values_list('ingredient__name', 'total_amount',
+            ShoppingListItem.objects
+            .filter(user=request.user)
+            .order_by('ingredient__name')
+            .values_list('ingredient__name', 'amount',
                          'ingredient__measurement_unit')
+            .iterator(chunk_size=SHOPPING_LIST_CHUNK_SIZE)
         )
-        file_list = []
-        [file_list.append(
-            '{} - {} {}'.format(*ingredient)) for ingredient in ingredients]
-        file = HttpResponse('Cписок покупок:\n' + '\n'.join(file_list),
-                            content_type='text/plain')
-        file['Content-Disposition'] = (f'attachment; filename={FILE_NAME}')
+        renderer = request.accepted_renderer
+        content_type = renderer.media_type
+        if renderer.charset:
+            content_type += f'; charset={renderer.charset}'
+        file = StreamingHttpResponse(renderer.stream(ingredients),
+                                     content_type=content_type)
+        file['Content-Disposition'] = (
+            f'attachment; filename={FILE_NAME}.{renderer.extension}')
         return file
 
+    @action(detail=False, methods=['get'],
+            permission_classes=(permissions.IsAdminUser,))
+    def cache_stats(self, request):
+        return Response(self.get_list_cache_stats())
+
+    @action(detail=False, methods=['get'],
+            permission_classes=(permissions.IsAuthenticated,))
+    def shopping_list(self, request):
+        items = (
+            ShoppingListItem.objects
+            .filter(user=request.user)
+            .select_related('ingredient')
+            .order_by('ingredient__name')
+        )
+        serializer = ShoppingListItemSerializer(items, many=True)
+        return Response(serializer.data)
+
 
-class IngredientViewSet(viewsets.ReadOnlyModelViewSet):
+class IngredientViewSet(ConditionalGetMixin, viewsets.ReadOnlyModelViewSet):
     queryset = Ingredient.objects.all()
     serializer_class = IngredientSerializer
     filterset_class = IngredientFilter
@@ -218,8 +587,82 @@ class IngredientViewSet(viewsets.ReadOnlyModelViewSet):
     filterset_fields = ('name',)
     search_fields = ('name',)
     pagination_class = None
+    catalogue_versions = ('ingredients',)
+
+    def list(self, request, *args, **kwargs):
+        return self.conditional(self.search, request, *args, **kwargs)
 
+    def search(self, request, *args, **kwargs):
+        params = request.query_params
+        if 'q' in params:
+            return Response(ranked_search(params['q']))
+        if 'name' in params and len(params) == 1:
+            return Response(ingredient_index.search(params['name']))
+        return mixins.ListModelMixin.list(self, request, *args, **kwargs)
 
-class TagViewSet(viewsets.ReadOnlyModelViewSet):
+
+class TagViewSet(ConditionalGetMixin, viewsets.ReadOnlyModelViewSet):
     queryset = Tag.objects.all()
     serializer_class = TagSerializer
+    catalogue_versions = ('tags',)
+
+
+class ImageUploadViewSet(mixins.CreateModelMixin,
+                         mixins.RetrieveModelMixin,
+                         viewsets.GenericViewSet):
+    """Загрузка картинки по частям.
+    POST создает сеанс с размером файла, PUT с заголовком Content-Range
+    дописывает байты, GET показывает, сколько уже получено,
+    complete проверяет картинку и завершает загрузку."""
+
+    serializer_class = ImageUploadSerializer
+    permission_classes = (permissions.IsAuthenticated,)
+    lookup_field = 'token'
+
+    def get_queryset(self):
+        return ImageUpload.objects.filter(user=self.request.user)
+
+    def perform_create(self, serializer):
+        expire_uploads()
+        upload = serializer.save(user=self.request.user)
+        os.makedirs(settings.UPLOAD_SESSION_DIR, exist_ok=True)
+        open(upload.path, 'wb').close()
+
+    def update(self, request, *args, **kwargs):
+        match = CONTENT_RANGE.fullmatch(
+            request.headers.get('Content-Range', ''))
+        if match is None:
+            raise exceptions.ValidationError(
+                {'Content-Range': 'Ожидается bytes <начало>-<конец>/<всего>'})
+        start, end, total = map(int, match.groups())
+        if request.stream is None:
+            raise exceptions.ValidationError('Нет данных для записи.')
+        with transaction.atomic():
+            upload = self.get_queryset().select_for_update().get(
+                pk=self.get_object().pk)
+            if (upload.completed or total != upload.size
+                    or start > end or end >= upload.size):
+                raise exceptions.ValidationError(
+                    {'Content-Range': 'Диапазон не совпадает с загрузкой.'})
+            if start > upload.received:
+                return Response(self.get_serializer(upload).data,
+                                status=status.HTTP_409_CONFLICT)
+            written = write_range(upload.path, start, end - start + 1,
+                                  request.stream)
+            upload.received = max(upload.received, start + written)
+            upload.save(update_fields=('received',))
+        return Response(self.get_serializer(upload).data)
+
+    @action(detail=True, methods=['post'])
+    def complete(self, request, token=None):
+        upload = self.get_object()
+        if upload.received != upload.size:
+            raise exceptions.ValidationError(
+                {'received': 'Загрузка не завершена.'})
+        if not upload.completed:
+            with open(upload.path, 'rb') as file:
+                extension = Base64ImageField().check_header(file)
+            upload.name = f'image.{extension}'
+            upload.completed = True
+            upload.save(update_fields=('name', 'completed',))
+        return Response(self.get_serializer(upload).data)
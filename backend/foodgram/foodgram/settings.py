@@ -1,4 +1,5 @@
 import os
+import tempfile
 from pathlib import Path
 
 from dotenv import load_dotenv
@@ -24,6 +25,7 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
+    'django.contrib.postgres',
     'recipes.apps.RecipesConfig',
     'users.apps.UsersConfig',
     'django_filters',
@@ -75,6 +77,42 @@ DATABASES = {
     }
 }
 
+CACHE_BACKEND = os.environ.get(
+    'CACHE_BACKEND', 'django.core.cache.backends.filebased.FileBasedCache')
+CACHES = {
+    'default': {
+        'BACKEND': CACHE_BACKEND,
+        'LOCATION': os.environ.get(
+            'CACHE_LOCATION',
+            os.path.join(tempfile.gettempdir(), 'foodgram_cache')),
+    }
+}
+if CACHE_BACKEND.endswith('FileBasedCache'):
+    # При переполнении файловый кэш удаляет треть записей вместе
+    # с версиями данных, поэтому предел должен вмещать кэш страниц,
+    # представлений рецептов и числа объектов.
+    CACHES['default']['OPTIONS'] = {
+        'MAX_ENTRIES': int(os.environ.get('CACHE_MAX_ENTRIES', 100000)),
+    }
+
+LIST_CACHE_TIMEOUT = int(os.environ.get('LIST_CACHE_TIMEOUT', 300))
+REPRESENTATION_CACHE_TIMEOUT = int(
+    os.environ.get('REPRESENTATION_CACHE_TIMEOUT', 3600))
+IMAGE_UPLOAD_MAX_SIZE = int(
+    os.environ.get('IMAGE_UPLOAD_MAX_SIZE', 10 * 1024 * 1024))
+IMAGE_UPLOAD_MAX_PIXELS = int(
+    os.environ.get('IMAGE_UPLOAD_MAX_PIXELS', 40_000_000))
+IMAGE_UPLOAD_FORMATS = ('JPEG', 'PNG', 'GIF', 'WEBP',)
+UPLOAD_SESSION_DIR = os.environ.get(
+    'UPLOAD_SESSION_DIR',
+    os.path.join(tempfile.gettempdir(), 'foodgram_uploads'))
+UPLOAD_SESSION_TTL = int(os.environ.get('UPLOAD_SESSION_TTL', 24 * 60 * 60))
+IMAGE_VARIANT_WORKERS = int(os.environ.get('IMAGE_VARIANT_WORKERS', 2))
+COUNT_CACHE_TIMEOUT = int(os.environ.get('COUNT_CACHE_TIMEOUT', 30))
+ESTIMATED_COUNT_THRESHOLD = int(
+    os.environ.get('ESTIMATED_COUNT_THRESHOLD', 100000))
+ADMIN_COUNT_LIMIT = int(os.environ.get('ADMIN_COUNT_LIMIT', 10000))
+
 
 AUTH_PASSWORD_VALIDATORS = [
     {
@@ -125,6 +163,9 @@ AUTH_USER_MODEL = 'users.User'
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
+SHOPPING_CART_FONT = os.environ.get(
+    'SHOPPING_CART_FONT', '/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf')
+
 
 CORS_ORIGIN_ALLOW_ALL = True
 CORS_URLS_REGEX = r'^/api/.*$'
@@ -1,47 +1,185 @@
+from collections import Counter, defaultdict
+
+from django.conf import settings
 from django.contrib import admin
+from django.core.paginator import EmptyPage, PageNotAnInteger, Paginator
+from django.db import transaction
+from django.utils import timezone
+from django.utils.functional import cached_property
 
 from . import models
 
 
+class LowerBound(int):
+    """Число, известное только снизу, выводится как «10000+»."""
+
+    def __str__(self):
+        return f'{int(self)}+'
+
+
+class LimitedCountPaginator(Paginator):
+    """Считает объекты не дальше ADMIN_COUNT_LIMIT:
+    полный COUNT(*) большой таблицы дольше, чем выборка страницы.
+    Если предел достигнут, страницы за ним открываются по одной:
+    страница выбирается с лишней строкой, и при ее наличии
+    появляется ссылка на следующую."""
+
+    last_page = 0
+
+    @cached_property
+    def count(self):
+        limit = settings.ADMIN_COUNT_LIMIT
+        count = self.object_list.order_by()[:limit].count()
+        if count < limit:
+            return count
+        return LowerBound(count)
+
+    @property
+    def exact(self):
+        return not isinstance(self.count, LowerBound)
+
+    @property
+    def num_pages(self):
+        return max(super().num_pages, self.last_page)
+
+    def validate_number(self, number):
+        if self.exact:
+            return super().validate_number(number)
+        try:
+            number = int(number)
+        except (TypeError, ValueError):
+            raise PageNotAnInteger('Номер страницы должен быть целым.')
+        if number < 1:
+            raise EmptyPage('Номер страницы меньше 1.')
+        return number
+
+    def page(self, number):
+        if self.exact:
+            return super().page(number)
+        number = self.validate_number(number)
+        bottom = (number - 1) * self.per_page
+        rows = list(self.object_list[bottom:bottom + self.per_page + 1])
+        if not rows:
+            raise EmptyPage('На странице нет объектов.')
+        self.last_page = number + (len(rows) > self.per_page)
+        return self._get_page(rows[:self.per_page], number, self)
+
+
+class BaseAdmin(admin.ModelAdmin):
+    """Список без полного подсчета строк таблицы."""
+
+    paginator = LimitedCountPaginator
+    show_full_result_count = False
+
+
+class UserRelationAdmin(BaseAdmin):
+    """Связь пользователя с рецептом: ее создают и удаляют, но не меняют,
+    иначе разойдутся счетчики."""
+
+    list_display = ('pk', 'user', 'recipe')
+    list_select_related = ('user', 'recipe')
+    autocomplete_fields = ('user', 'recipe')
+    search_fields = ('user__username', 'recipe__name')
+
+    def get_readonly_fields(self, request, obj=None):
+        if obj is not None:
+            return ('user', 'recipe')
+        return ()
+
+
 @admin.register(models.Ingredient)
-class IngredientAdmin(admin.ModelAdmin):
+class IngredientAdmin(BaseAdmin):
     list_display = ('pk', 'name', 'measurement_unit')
-    list_filter = ('name', )
+    list_filter = ('measurement_unit', )
     search_fields = ('name', )
 
 
 @admin.register(models.Tag)
-class TagAdmin(admin.ModelAdmin):
+class TagAdmin(BaseAdmin):
     list_display = ('pk', 'name', 'color', 'slug')
     list_editable = ('name', 'color', 'slug')
+    search_fields = ('name', 'slug')
     empty_value_display = '-пусто-'
 
 
 @admin.register(models.Recipe)
-class RecipeAdmin(admin.ModelAdmin):
+class RecipeAdmin(BaseAdmin):
     list_display = ('pk', 'name', 'author', 'in_favorites')
+    list_select_related = ('author', )
     readonly_fields = ('in_favorites',)
-    list_filter = ('name', 'author', 'tags')
+    autocomplete_fields = ('author', )
+    list_filter = ('tags', 'pub_date')
+    search_fields = ('name', 'author__username')
     empty_value_display = '-пусто-'
 
-    @admin.display(description='В избранном')
+    @admin.display(description='В избранном', ordering='favorites_count')
     def in_favorites(self, obj):
-        return obj.favorites_recipe.count()
+        return obj.favorites_count
 
 
 @admin.register(models.RecipeIngredient)
-class RecipeIngredientAdmin(admin.ModelAdmin):
+class RecipeIngredientAdmin(BaseAdmin):
     list_display = ('pk', 'recipe', 'ingredient', 'amount')
-    list_editable = ('recipe', 'ingredient', 'amount')
+    list_editable = ('amount', )
+    list_select_related = ('recipe', 'ingredient')
+    autocomplete_fields = ('recipe', 'ingredient')
+    search_fields = ('recipe__name', 'ingredient__name')
+
+    def touch_recipes(self, recipe_ids):
+        """Состав рецепта изменился: обновляем дату изменения рецепта,
+        от которой зависят ETag и кэш представлений."""
+        models.Recipe.objects.filter(pk__in=recipe_ids).update(
+            updated_at=timezone.now())
+
+    def update_shopping_lists(self, removed=(), added=()):
+        """Переносит изменение состава в итоги списков покупок
+        пользователей, у которых рецепт в корзине.
+        Строки - (id рецепта, id ингредиента, количество)."""
+        changes = defaultdict(Counter)
+        for rows, sign in ((removed, -1), (added, 1)):
+            for recipe_id, ingredient_id, amount in rows:
+                changes[recipe_id][ingredient_id] += sign * amount
+        for recipe_id, amounts in changes.items():
+            models.ShoppingListItem.objects.change_recipe(recipe_id, amounts)
+
+    def save_model(self, request, obj, form, change):
+        with transaction.atomic():
+            old = list(models.RecipeIngredient.objects.filter(
+                pk=obj.pk).values_list('recipe_id', 'ingredient_id', 'amount'))
+            super().save_model(request, obj, form, change)
+            self.update_shopping_lists(
+                old, [(obj.recipe_id, obj.ingredient_id, obj.amount)])
+            self.touch_recipes({obj.recipe_id, *(row[0] for row in old)})
+
+    def delete_model(self, request, obj):
+        with transaction.atomic():
+            super().delete_model(request, obj)
+            self.update_shopping_lists(
+                [(obj.recipe_id, obj.ingredient_id, obj.amount)])
+            self.touch_recipes([obj.recipe_id])
+
+    def delete_queryset(self, request, queryset):
+        with transaction.atomic():
+            rows = list(queryset.values_list(
+                'recipe_id', 'ingredient_id', 'amount'))
+            super().delete_queryset(request, queryset)
+            self.update_shopping_lists(rows)
+            self.touch_recipes({row[0] for row in rows})
 
 
 @admin.register(models.Favorite)
-class FavoriteAdmin(admin.ModelAdmin):
-    list_display = ('pk', 'user', 'recipe')
-    list_editable = ('user', 'recipe')
+class FavoriteAdmin(UserRelationAdmin):
+    pass
 
 
 @admin.register(models.ShoppingCart)
-class ShoppingCartAdmin(admin.ModelAdmin):
-    list_display = ('pk', 'user', 'recipe')
-    list_editable = ('user', 'recipe')
+class ShoppingCartAdmin(UserRelationAdmin):
+    pass
+
+
+@admin.register(models.ShoppingListItem)
+class ShoppingListItemAdmin(BaseAdmin):
+    list_display = ('pk', 'user', 'ingredient', 'amount')
+    list_select_related = ('user', 'ingredient')
+    readonly_fields = ('user', 'ingredient', 'amount')
+    search_fields = ('user__username', 'ingredient__name')
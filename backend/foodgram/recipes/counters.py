@@ -0,0 +1,49 @@
+from django.contrib.auth import get_user_model
+from django.db.models import Count, F, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+from .models import Favorite, Recipe, Subscription
+
+User = get_user_model()
+
+# Модель-источник: (модель со счетчиком, поле счетчика, поле связи).
+COUNTERS = {
+    Favorite: (Recipe, 'favorites_count', 'recipe_id'),
+    Subscription: (User, 'subscribers_count', 'author_id'),
+    Recipe: (User, 'recipes_count', 'author_id'),
+}
+
+
+def change_counter(model, target_ids, delta):
+    """Меняет счетчик объектов `target_ids` одним UPDATE.
+    Счетчик не уходит ниже нуля, даже если успел разойтись с данными."""
+    counted, field, _ = COUNTERS[model]
+    targets = counted.objects.filter(pk__in=target_ids)
+    if delta < 0:
+        targets = targets.filter(**{f'{field}__gte': -delta})
+    return targets.update(**{field: F(field) + delta})
+
+
+def counted_id(instance):
+    """Первичный ключ объекта, чей счетчик зависит от `instance`."""
+    return getattr(instance, COUNTERS[type(instance)][2])
+
+
+def actual_count(model):
+    """Подзапрос с настоящим значением счетчика."""
+    _, _, link = COUNTERS[model]
+    rows = model.objects.filter(**{link: OuterRef('pk')}).order_by()
+    return Coalesce(Subquery(
+        rows.values(link).annotate(total=Count('pk')).values('total')), 0)
+
+
+def reconcile_counter(model, dry_run=False):
+    """Исправляет разошедшиеся счетчики и возвращает их количество."""
+    counted, field, _ = COUNTERS[model]
+    drifted = list(counted.objects.annotate(
+        actual=actual_count(model),
+    ).exclude(**{field: F('actual')}).values_list('pk', flat=True))
+    if drifted and not dry_run:
+        counted.objects.filter(pk__in=drifted).update(
+            **{field: actual_count(model)})
+    return len(drifted)
@@ -0,0 +1,44 @@
+"""Построение уменьшенных копий картинок.
+Модуль не зависит от Django, чтобы его функции
+можно было выполнять в отдельных процессах."""
+from pathlib import Path
+
+from PIL import Image, ImageOps
+
+VARIANT_SIZES = {
+    'small': (320, 240),
+    'medium': (640, 480),
+}
+VARIANT_FORMATS = {
+    'jpeg': {'format': 'JPEG', 'quality': 85, 'optimize': True},
+    'webp': {'format': 'WEBP', 'quality': 80, 'method': 4},
+    'avif': {'format': 'AVIF', 'quality': 60},
+}
+
+
+def available_formats():
+    """Форматы, которые умеет сохранять установленный Pillow."""
+    Image.init()
+    return {
+        extension: options
+        for extension, options in VARIANT_FORMATS.items()
+        if options['format'] in Image.SAVE
+    }
+
+
+def build_variants(source, target):
+    """Сохраняет копии картинки `source` рядом с префиксом пути `target`
+    и возвращает {размер: {расширение: суффикс имени файла}}."""
+    formats = available_formats()
+    Path(target).parent.mkdir(parents=True, exist_ok=True)
+    variants = {}
+    with Image.open(source) as image:
+        image = ImageOps.exif_transpose(image).convert('RGB')
+        for size_name, size in VARIANT_SIZES.items():
+            thumbnail = ImageOps.fit(image, size, Image.LANCZOS)
+            variants[size_name] = {}
+            for extension, options in formats.items():
+                suffix = f'_{size_name}.{extension}'
+                thumbnail.save(f'{target}{suffix}', **options)
+                variants[size_name][extension] = suffix
+    return variants
@@ -0,0 +1,57 @@
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from django.core.management import BaseCommand, CommandError
+
+from recipes.imaging import build_variants
+from recipes.models import Recipe
+from recipes.variants import save_variants, variant_paths
+
+
+class Command(BaseCommand):
+    help = ('Строит уменьшенные копии картинок рецептов. '
+            'Рецепты с готовыми копиями пропускаются, '
+            'поэтому прерванный запуск можно продолжить.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--workers', type=int, default=os.cpu_count(),
+            help='Количество процессов')
+        parser.add_argument(
+            '--force', action='store_true',
+            help='Перестроить копии всех картинок')
+
+    def get_pending(self, force):
+        recipes = Recipe.objects.exclude(image='').values_list(
+            'id', 'image', 'image_variants').order_by('id')
+        return [
+            (pk, image)
+            for pk, image, variants in recipes.iterator()
+            if force or variants.get('source') != image
+        ]
+
+    def handle(self, *args, **options):
+        if options['workers'] < 1:
+            raise CommandError('--workers должен быть больше нуля')
+        pending = self.get_pending(options['force'])
+        self.stdout.write(f'Картинок в очереди: {len(pending)}')
+        done = failed = 0
+        with ProcessPoolExecutor(options['workers']) as executor:
+            futures = {
+                executor.submit(build_variants, *variant_paths(image)):
+                    (pk, image)
+                for pk, image in pending
+            }
+            for future in as_completed(futures):
+                pk, image = futures[future]
+                try:
+                    save_variants(pk, image, future.result())
+                except Exception as error:
+                    failed += 1
+                    self.stderr.write(f'{image}: {error}')
+                    continue
+                done += 1
+                if options['verbosity'] > 1:
+                    self.stdout.write(f'+ {image}')
+        self.stdout.write(self.style.SUCCESS(
+            f'Готово: {done}, с ошибками: {failed}'))
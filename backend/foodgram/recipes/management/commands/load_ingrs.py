@@ -1,28 +1,37 @@
-import json
+from collections import Counter
 
 from django.conf import settings
-from django.core.management import BaseCommand
 
+from recipes.management.loaders import BulkLoadCommand
 from recipes.models import Ingredient
+from recipes.versions import bump_version
 
 
-class Command(BaseCommand):
-    help = 'Загрузка из csv файла'
+class Command(BulkLoadCommand):
+    help = 'Загрузка ингредиентов из json или csv файла'
 
-    def handle(self, *args, **kwargs):
-        data_path = settings.BASE_DIR
-        with open(
-            f'{data_path}/data/ingredients.json',
-            'r'
-        ) as file:
-            data = json.load(file)
+    fields = ('name', 'measurement_unit')
+    default_path = settings.BASE_DIR / 'data' / 'ingredients.json'
 
-        for note in data:
-            try:
-                Ingredient.objects.get_or_create(**note)
-                print(f"{note['name']} в базе")
-            except Exception as error:
-                print(f"Ошибка при добавлении {note['name']}.\n"
-                      f"{error}")
+    def load_batch(self, batch, dry_run):
+        keys = dict.fromkeys(
+            (row['name'].strip(), row['measurement_unit'].strip())
+            for row in batch if row['name'] and row['measurement_unit'])
+        existing = set(
+            Ingredient.objects
+            .filter(name__in={name for name, _ in keys})
+            .values_list('name', 'measurement_unit')
+        )
+        new = [key for key in keys if key not in existing]
+        for name, unit in new:
+            self.report('+', f'{name}, {unit}')
+        if not dry_run:
+            Ingredient.objects.bulk_create(
+                (Ingredient(name=name, measurement_unit=unit)
+                 for name, unit in new),
+                ignore_conflicts=True,
+            )
+        return Counter(created=len(new), unchanged=len(batch) - len(new))
 
-        print('Загрузка ингредиентов завершена')
+    def after_load(self):
+        bump_version('ingredients')
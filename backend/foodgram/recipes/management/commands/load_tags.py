@@ -1,15 +1,51 @@
-from django.core.management import BaseCommand
+from collections import Counter
 
+from recipes.management.loaders import BulkLoadCommand
 from recipes.models import Tag
+from recipes.versions import bump_version
 
+TAGS = (
+    {'name': 'Завтрак', 'color': '#E26C2D', 'slug': 'breakfast'},
+    {'name': 'Обед', 'color': '#49B64E', 'slug': 'dinner'},
+    {'name': 'Ужин', 'color': '#8775D2', 'slug': 'supper'},
+)
 
-class Command(BaseCommand):
+
+class Command(BulkLoadCommand):
     help = 'Создаем тэги'
 
-    def handle(self, *args, **kwargs):
-        data = [
-            {'name': 'Завтрак', 'color': '#E26C2D', 'slug': 'breakfast'},
-            {'name': 'Обед', 'color': '#49B64E', 'slug': 'dinner'},
-            {'name': 'Ужин', 'color': '#8775D2', 'slug': 'supper'}]
-        Tag.objects.bulk_create(Tag(**tag) for tag in data)
-        self.stdout.write(self.style.SUCCESS('Все тэги загружены!'))
+    fields = ('name', 'color', 'slug')
+    update_fields = ('name', 'color')
+
+    def get_rows(self, path):
+        if path is None:
+            return TAGS
+        return super().get_rows(path)
+
+    def load_batch(self, batch, dry_run):
+        rows = {row['slug']: row for row in batch}
+        existing = Tag.objects.in_bulk(rows, field_name='slug')
+        new = []
+        changed = []
+        for slug, row in rows.items():
+            tag = existing.get(slug)
+            if tag is None:
+                self.report('+', slug)
+                new.append(Tag(**row))
+                continue
+            diff = {field: row[field] for field in self.update_fields
+                    if getattr(tag, field) != row[field]}
+            if diff:
+                self.report('~', f'{slug}: {diff}')
+                for field, value in diff.items():
+                    setattr(tag, field, value)
+                changed.append(tag)
+        if not dry_run:
+            Tag.objects.bulk_update(changed, self.update_fields)
+            Tag.objects.bulk_create(new, ignore_conflicts=True)
+        return Counter(created=len(new),
+                       updated=len(changed),
+                       unchanged=len(rows) - len(new) - len(changed))
+
+    def after_load(self):
+        bump_version('tags')
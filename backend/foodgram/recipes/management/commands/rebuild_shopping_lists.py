@@ -0,0 +1,53 @@
+from django.core.management import BaseCommand
+
+from recipes.models import ShoppingListItem
+
+
+class Command(BaseCommand):
+    help = 'Пересчет итогов списков покупок по корзинам'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--verify', action='store_true',
+            help='Только проверить расхождения, ничего не меняя')
+        parser.add_argument(
+            '--user', type=int, action='append', dest='users',
+            help='id пользователя (можно указать несколько раз)')
+
+    def find_mismatches(self, user_ids):
+        expected = {
+            (user_id, ingredient_id): total
+            for user_id, ingredient_id, total
+            in ShoppingListItem.objects.expected(user_ids).iterator()
+        }
+        items = ShoppingListItem.objects.all()
+        if user_ids is not None:
+            items = items.filter(user_id__in=user_ids)
+        mismatches = []
+        for user_id, ingredient_id, amount in items.values_list(
+                'user_id', 'ingredient_id', 'amount').iterator():
+            total = expected.pop((user_id, ingredient_id), None)
+            if total != amount:
+                mismatches.append((user_id, ingredient_id, amount, total))
+        mismatches.extend(
+            (user_id, ingredient_id, None, total)
+            for (user_id, ingredient_id), total in expected.items())
+        return mismatches
+
+    def handle(self, *args, **options):
+        user_ids = options['users']
+        mismatches = self.find_mismatches(user_ids)
+        for user_id, ingredient_id, amount, total in mismatches:
+            self.stdout.write(
+                f'Пользователь {user_id}, ингредиент {ingredient_id}: '
+                f'в таблице {amount}, ожидается {total}')
+        if options['verify']:
+            if mismatches:
+                self.stdout.write(self.style.ERROR(
+                    f'Найдено расхождений: {len(mismatches)}'))
+            else:
+                self.stdout.write(self.style.SUCCESS('Расхождений нет'))
+            return
+        ShoppingListItem.objects.rebuild(user_ids)
+        self.stdout.write(self.style.SUCCESS(
+            f'Списки покупок пересчитаны, исправлено: {len(mismatches)}'))
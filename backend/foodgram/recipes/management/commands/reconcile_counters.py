@@ -0,0 +1,24 @@
+from django.core.management import BaseCommand
+
+from recipes.counters import COUNTERS, reconcile_counter
+
+
+class Command(BaseCommand):
+    help = ('Сверяет счетчики избранного, рецептов и подписчиков '
+            'с данными и исправляет разошедшиеся.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--dry-run', action='store_true',
+            help='Только показать число разошедшихся счетчиков')
+
+    def handle(self, *args, **options):
+        total = 0
+        for model, (counted, field, _) in COUNTERS.items():
+            drifted = reconcile_counter(model, options['dry_run'])
+            total += drifted
+            self.stdout.write(
+                f'{counted._meta.model_name}.{field}: {drifted}')
+        action = 'Найдено' if options['dry_run'] else 'Исправлено'
+        self.stdout.write(self.style.SUCCESS(
+            f'{action} разошедшихся счетчиков: {total}'))
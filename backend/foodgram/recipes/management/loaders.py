@@ -0,0 +1,115 @@
+import csv
+import json
+from collections import Counter
+from itertools import islice
+from pathlib import Path
+
+from django.core.management import BaseCommand, CommandError
+from django.db import transaction
+
+
+def iter_json_array(file, chunk_size=64 * 1024):
+    """Потоково читает объекты из JSON-массива, не загружая файл целиком."""
+    decoder = json.JSONDecoder()
+    buffer = file.read(chunk_size).lstrip()
+    if not buffer.startswith('['):
+        raise CommandError('Ожидается JSON-массив')
+    pos = 1
+    while True:
+        while pos < len(buffer) and buffer[pos] in ' \t\r\n,':
+            pos += 1
+        if buffer.startswith(']', pos):
+            return
+        try:
+            item, pos = decoder.raw_decode(buffer, pos)
+        except json.JSONDecodeError as error:
+            chunk = file.read(chunk_size)
+            if not chunk:
+                raise CommandError(f'Некорректный JSON: {error}')
+            buffer = buffer[pos:] + chunk
+            pos = 0
+            continue
+        yield item
+
+
+def read_rows(path, fields):
+    """Строки файла JSON или CSV в виде словарей с полями `fields`.
+    В CSV поля идут по порядку, строка-заголовок пропускается."""
+    extension = Path(path).suffix.lower()
+    if extension not in ('.json', '.csv'):
+        raise CommandError('Поддерживаются только файлы .json и .csv')
+    with open(path, encoding='utf-8', newline='') as file:
+        if extension == '.json':
+            for item in iter_json_array(file):
+                yield {field: item.get(field) for field in fields}
+            return
+        for row in csv.reader(file):
+            if not row or row == list(fields):
+                continue
+            yield dict(zip(fields, row))
+
+
+def batched(iterable, size):
+    iterator = iter(iterable)
+    while True:
+        batch = list(islice(iterator, size))
+        if not batch:
+            return
+        yield batch
+
+
+class BulkLoadCommand(BaseCommand):
+    """Базовая команда пакетной загрузки справочника.
+    Наследники задают `fields`, `default_path` и `load_batch`."""
+
+    fields = ()
+    default_path = None
+    batch_size = 1000
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--path', default=self.default_path,
+            help='Файл .json или .csv с данными')
+        parser.add_argument(
+            '--batch-size', type=int, default=self.batch_size,
+            help='Количество строк в одном запросе')
+        parser.add_argument(
+            '--dry-run', action='store_true',
+            help='Показать изменения, ничего не записывая')
+
+    def get_rows(self, path):
+        return read_rows(path, self.fields)
+
+    def load_batch(self, batch, dry_run):
+        """Загружает пакет строк и возвращает Counter
+        с ключами created, updated, unchanged."""
+        raise NotImplementedError
+
+    def after_load(self):
+        pass
+
+    def report(self, sign, text):
+        if self.verbosity > 1:
+            self.stdout.write(f'{sign} {text}')
+
+    def handle(self, *args, **options):
+        self.verbosity = options['verbosity']
+        dry_run = options['dry_run']
+        if options['batch_size'] < 1:
+            raise CommandError('--batch-size должен быть больше нуля')
+        totals = Counter()
+        processed = 0
+        with transaction.atomic():
+            for batch in batched(self.get_rows(options['path']),
+                                 options['batch_size']):
+                totals.update(self.load_batch(batch, dry_run))
+                processed += len(batch)
+                if self.verbosity > 0:
+                    self.stdout.write(f'Обработано строк: {processed}')
+        if not dry_run:
+            self.after_load()
+        prefix = 'Пробный запуск. ' if dry_run else ''
+        self.stdout.write(self.style.SUCCESS(
+            f'{prefix}Добавлено: {totals["created"]}, '
+            f'обновлено: {totals["updated"]}, '
+            f'без изменений: {totals["unchanged"]}'))
@@ -0,0 +1,62 @@
+# Generated by Django 3.2.19 on 2026-10-17 04:05
+
+from django.db import migrations, models
+from django.db.models import Count, F, Min
+
+
+def merge_rows(model, owner, keep, extra):
+    """Переносит строки `model` с ингредиентов `extra` на `keep`.
+    Если у владельца уже есть строка с `keep`, количества складываются."""
+    for row in model.objects.filter(ingredient_id__in=extra).order_by('id'):
+        kept = model.objects.filter(
+            **{owner: getattr(row, owner)}, ingredient_id=keep)
+        if kept.exists():
+            kept.update(amount=F('amount') + row.amount)
+            row.delete()
+        else:
+            row.ingredient_id = keep
+            row.save(update_fields=['ingredient'])
+
+
+def merge_duplicates(apps, schema_editor):
+    """Сводит одинаковые ингредиенты к строке с наименьшим id:
+    до ограничения уникальности админка позволяла создавать дубли."""
+    Ingredient = apps.get_model('recipes', 'Ingredient')
+    RecipeIngredient = apps.get_model('recipes', 'RecipeIngredient')
+    ShoppingListItem = apps.get_model('recipes', 'ShoppingListItem')
+    groups = (
+        Ingredient.objects
+        .values('name', 'measurement_unit')
+        .annotate(keep=Min('id'), total=Count('id'))
+        .filter(total__gt=1)
+        .order_by()
+    )
+    for group in groups:
+        extra = list(
+            Ingredient.objects
+            .filter(name=group['name'],
+                    measurement_unit=group['measurement_unit'])
+            .exclude(id=group['keep'])
+            .values_list('id', flat=True))
+        merge_rows(RecipeIngredient, 'recipe_id', group['keep'], extra)
+        merge_rows(ShoppingListItem, 'user_id', group['keep'], extra)
+        Ingredient.objects.filter(id__in=extra).delete()
+    if schema_editor.connection.vendor == 'postgresql':
+        # Отложенные проверки внешних ключей не дают изменить
+        # таблицу в той же транзакции, выполняем их сейчас.
+        schema_editor.execute('SET CONSTRAINTS ALL IMMEDIATE')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0009_ingredient_name_trgm'),
+    ]
+
+    operations = [
+        migrations.RunPython(merge_duplicates, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='ingredient',
+            constraint=models.UniqueConstraint(fields=('name', 'measurement_unit'), name='unique_ingredient'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 3.2.19 on 2026-10-17 04:13
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0012_recipe_feed_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipe',
+            name='image_variants',
+            field=models.JSONField(blank=True, default=dict, help_text='Уменьшенные копии картинки в разных форматах', verbose_name='Варианты картинки'),
+        ),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 3.2.19 on 2026-10-17 04:15
+
+from django.db import migrations, models
+import recipes.storage
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0013_recipe_image_variants'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='recipe',
+            name='image',
+            field=models.ImageField(help_text='Картинка блюда', storage=recipes.storage.ContentAddressedStorage(), upload_to='recipes/', verbose_name='Картинка блюда'),
+        ),
+    ]
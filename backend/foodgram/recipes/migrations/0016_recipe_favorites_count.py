@@ -0,0 +1,40 @@
+# Generated by Django 3.2.19 on 2026-10-17 04:21
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def count_rows(model, link):
+    rows = model.objects.filter(**{link: OuterRef('pk')}).order_by()
+    return Coalesce(Subquery(
+        rows.values(link).annotate(total=Count('pk')).values('total')), 0)
+
+
+def fill_counters(apps, schema_editor):
+    Recipe = apps.get_model('recipes', 'Recipe')
+    Favorite = apps.get_model('recipes', 'Favorite')
+    Subscription = apps.get_model('recipes', 'Subscription')
+    User = apps.get_model('users', 'User')
+    Recipe.objects.update(favorites_count=count_rows(Favorite, 'recipe_id'))
+    User.objects.update(
+        recipes_count=count_rows(Recipe, 'author_id'),
+        subscribers_count=count_rows(Subscription, 'author_id'),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0004_user_counters'),
+        ('recipes', '0015_imageupload'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipe',
+            name='favorites_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Добавлений в избранное'),
+        ),
+        migrations.RunPython(fill_counters, migrations.RunPython.noop),
+    ]
@@ -1,6 +1,13 @@
+import os
+import uuid
+
+from django.conf import settings
 from django.core.validators import MinValueValidator, RegexValidator
 from django.contrib.auth import get_user_model
-from django.db import models
+from django.db import models, transaction
+from django.db.models import Case, F, Sum, Value, When
+
+from .storage import ContentAddressedStorage
 
 User = get_user_model()
 
@@ -21,6 +28,12 @@ class Ingredient(models.Model):
         ordering = ['name']
         verbose_name = 'Ингридиент'
         verbose_name_plural = 'Ингридиенты'
+        constraints = [
+            models.UniqueConstraint(
+                fields=['name', 'measurement_unit'],
+                name='unique_ingredient'
+            )
+        ]
 
     def __str__(self):
         return f'{self.name}, {self.measurement_unit}'
@@ -76,8 +89,15 @@ class Recipe(models.Model):
     image = models.ImageField(
         'Картинка блюда',
         upload_to='recipes/',
+        storage=ContentAddressedStorage(),
         help_text='Картинка блюда',
     )
+    image_variants = models.JSONField(
+        'Варианты картинки',
+        default=dict,
+        blank=True,
+        help_text='Уменьшенные копии картинки в разных форматах',
+    )
     text = models.TextField(
         'Описание рецепта',
         help_text='Описание рецепта',
@@ -100,9 +120,21 @@ class Recipe(models.Model):
         'Дата публикации',
         auto_now_add=True
     )
+    updated_at = models.DateTimeField(
+        'Дата изменения',
+        auto_now=True
+    )
+    favorites_count = models.PositiveIntegerField(
+        'Добавлений в избранное',
+        default=0,
+        editable=False,
+    )
 
     class Meta:
-        ordering = ['-pub_date']
+        ordering = ['-pub_date', '-id']
+        indexes = [
+            models.Index(fields=['-pub_date', '-id'], name='recipe_feed'),
+        ]
         verbose_name = 'Рецепт'
         verbose_name_plural = 'Рецепты'
 
@@ -241,3 +273,158 @@ class ShoppingCart(models.Model):
 
     def __str__(self):
         return f'Рецепт {self.recipe} в списке покупок у {self.user}'
+
+
+class ShoppingListItemManager(models.Manager):
+    """Инкрементальное обновление итогов списка покупок."""
+
+    def apply_changes(self, user_ids, changes):
+        """Изменяет количество ингредиентов у пользователей `user_ids`.
+        `changes` - словарь {id ингредиента: изменение количества}."""
+        user_ids = list(user_ids)
+        changes = {key: value for key, value in changes.items() if value}
+        if not user_ids or not changes:
+            return
+        with transaction.atomic():
+            self.bulk_create(
+                (self.model(user_id=user_id,
+                            ingredient_id=ingredient_id,
+                            amount=0)
+                 for user_id in user_ids
+                 for ingredient_id, delta in changes.items()
+                 if delta > 0),
+                ignore_conflicts=True,
+            )
+            self.filter(
+                user_id__in=user_ids,
+                ingredient_id__in=changes,
+            ).update(amount=F('amount') + Case(
+                *(When(ingredient_id=ingredient_id, then=Value(delta))
+                  for ingredient_id, delta in changes.items()),
+                default=Value(0),
+                output_field=models.IntegerField(),
+            ))
+            self.filter(user_id__in=user_ids, amount__lte=0).delete()
+
+    def recipe_amounts(self, recipe_ids):
+        """Суммарное количество ингредиентов в рецептах."""
+        return dict(
+            RecipeIngredient.objects
+            .filter(recipe_id__in=recipe_ids)
+            .values('ingredient_id')
+            .annotate(total=Sum('amount'))
+            .values_list('ingredient_id', 'total')
+            .order_by()
+        )
+
+    def add_recipes(self, user, recipe_ids):
+        self.apply_changes([user.id], self.recipe_amounts(recipe_ids))
+
+    def remove_recipes(self, user, recipe_ids):
+        amounts = self.recipe_amounts(recipe_ids)
+        self.apply_changes(
+            [user.id], {key: -value for key, value in amounts.items()})
+
+    def change_recipe(self, recipe, changes):
+        """Переносит изменения состава рецепта
+        в списки всех пользователей, добавивших его в корзину."""
+        user_ids = ShoppingCart.objects.filter(
+            recipe=recipe).values_list('user_id', flat=True)
+        self.apply_changes(user_ids, changes)
+
+    def expected(self, user_ids=None):
+        """Итоги, посчитанные заново по корзинам."""
+        if user_ids is None:
+            queryset = RecipeIngredient.objects.filter(
+                recipe__shopping_recipe__isnull=False)
+        else:
+            queryset = RecipeIngredient.objects.filter(
+                recipe__shopping_recipe__user_id__in=user_ids)
+        return (
+            queryset
+            .values('recipe__shopping_recipe__user', 'ingredient')
+            .annotate(total=Sum('amount'))
+            .values_list('recipe__shopping_recipe__user', 'ingredient',
+                         'total')
+            .order_by()
+        )
+
+    def rebuild(self, user_ids=None, batch_size=1000):
+        with transaction.atomic():
+            current = self.all()
+            if user_ids is not None:
+                current = current.filter(user_id__in=user_ids)
+            current.delete()
+            self.bulk_create(
+                (self.model(user_id=user_id,
+                            ingredient_id=ingredient_id,
+                            amount=total)
+                 for user_id, ingredient_id, total
+                 in self.expected(user_ids).iterator()),
+                batch_size=batch_size,
+            )
+
+
+class ShoppingListItem(models.Model):
+    """Модель итогового количества ингредиента в списке покупок.
+    Обновляется при изменении корзины и состава рецептов в ней."""
+
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='shopping_list',
+        verbose_name='Пользователь'
+    )
+    ingredient = models.ForeignKey(
+        Ingredient,
+        on_delete=models.CASCADE,
+        related_name='shopping_list_items',
+        verbose_name='Ингредиент'
+    )
+    amount = models.IntegerField('Количество')
+
+    objects = ShoppingListItemManager()
+
+    class Meta:
+        verbose_name = 'Ингредиент в списке покупок'
+        verbose_name_plural = 'Ингредиенты в списках покупок'
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'ingredient'],
+                name='unique_shopping_list_item'
+            )
+        ]
+
+    def __str__(self):
+        return f'{self.user}: {self.ingredient} - {self.amount}'
+
+
+class ImageUpload(models.Model):
+    """Сеанс загрузки картинки по частям.
+    Данные пишутся во временный файл, после завершения загрузки
+    токен сеанса можно передать в поле картинки рецепта."""
+
+    token = models.UUIDField(
+        'Токен', default=uuid.uuid4, unique=True, editable=False)
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='image_uploads',
+        verbose_name='Пользователь'
+    )
+    size = models.PositiveIntegerField('Размер файла')
+    received = models.PositiveIntegerField('Получено байт', default=0)
+    name = models.CharField('Имя файла', max_length=50, blank=True)
+    completed = models.BooleanField('Загрузка завершена', default=False)
+    created = models.DateTimeField('Дата создания', auto_now_add=True)
+
+    class Meta:
+        verbose_name = 'Загрузка картинки'
+        verbose_name_plural = 'Загрузки картинок'
+
+    def __str__(self):
+        return f'{self.user}: {self.received}/{self.size}'
+
+    @property
+    def path(self):
+        return os.path.join(settings.UPLOAD_SESSION_DIR, self.token.hex)
@@ -0,0 +1,176 @@
+import threading
+from bisect import bisect_left
+from collections import Counter
+
+from django.contrib.postgres.search import TrigramSimilarity
+from django.db import connection
+from django.db.models import Case, IntegerField, Q, Value, When
+from django.db.models.functions import Greatest, Length
+
+from .models import Ingredient
+from .versions import get_version
+
+RANKED_SEARCH_LIMIT = 20
+SIMILARITY_THRESHOLD = 0.3
+
+LATIN_KEYS = '`qwertyuiop[]asdfghjkl;\'zxcvbnm,./'
+CYRILLIC_KEYS = 'ёйцукенгшщзхъфывапролджэячсмитьбю.'
+LAYOUT = {
+    **str.maketrans(LATIN_KEYS, CYRILLIC_KEYS),
+    **str.maketrans(CYRILLIC_KEYS[:-1], LATIN_KEYS[:-1]),
+}
+
+
+def normalize(value):
+    return ' '.join(value.casefold().split())
+
+
+def swap_layout(value):
+    """Строка, набранная в другой раскладке клавиатуры."""
+    return value.translate(LAYOUT)
+
+
+def trigrams(value):
+    """Триграммы слов строки, как их считает pg_trgm."""
+    result = set()
+    for word in value.split():
+        word = f'  {word} '
+        result.update(word[pos:pos + 3] for pos in range(len(word) - 2))
+    return result
+
+
+class IngredientIndex:
+    """Отсортированный индекс названий ингредиентов в памяти процесса.
+    Поиск по началу названия выполняется бинарным поиском.
+    Индекс перестраивается, если изменилась версия в общем кэше."""
+
+    def __init__(self):
+        self.version = None
+        self.keys = None
+        self.entries = None
+        self.trigram_sizes = None
+        self.trigram_index = None
+        self.lock = threading.Lock()
+
+    def build(self):
+        rows = sorted(
+            (normalize(name), pk, name, unit)
+            for pk, name, unit in Ingredient.objects.values_list(
+                'id', 'name', 'measurement_unit').order_by().iterator()
+        )
+        self.keys = [row[0] for row in rows]
+        self.entries = [
+            {'id': pk, 'name': name, 'measurement_unit': unit}
+            for _, pk, name, unit in rows
+        ]
+        self.trigram_sizes = []
+        self.trigram_index = {}
+        for pos, key in enumerate(self.keys):
+            key_trigrams = trigrams(key)
+            self.trigram_sizes.append(len(key_trigrams))
+            for trigram in key_trigrams:
+                self.trigram_index.setdefault(trigram, []).append(pos)
+
+    def refresh(self):
+        version = get_version('ingredients')
+        if self.keys is not None and version == self.version:
+            return
+        with self.lock:
+            if self.keys is None or version != self.version:
+                self.build()
+                self.version = version
+
+    def prefix_range(self, query):
+        lo = bisect_left(self.keys, query)
+        hi = bisect_left(self.keys, query + '\U0010ffff', lo)
+        return lo, hi
+
+    def search(self, query, limit=None):
+        """Ингредиенты, название которых начинается с `query`.
+        Сначала точное совпадение, затем более короткие названия."""
+        self.refresh()
+        query = normalize(query)
+        lo, hi = self.prefix_range(query)
+        positions = sorted(
+            range(lo, hi), key=lambda pos: (len(self.keys[pos]), pos))
+        if limit is not None:
+            positions = positions[:limit]
+        return [self.entries[pos] for pos in positions]
+
+    def rank(self, query):
+        """Позиции совпадений с ключами сортировки:
+        начало названия, подстрока, похожесть по триграммам."""
+        lo, hi = self.prefix_range(query)
+        ranked = {
+            pos: (0, 0, len(self.keys[pos]), pos) for pos in range(lo, hi)}
+        for pos, key in enumerate(self.keys):
+            if pos not in ranked and query in key:
+                ranked[pos] = (1, key.find(query), len(key), pos)
+        query_trigrams = trigrams(query)
+        shared = Counter(
+            pos
+            for trigram in query_trigrams
+            for pos in self.trigram_index.get(trigram, ()))
+        for pos, count in shared.items():
+            if pos in ranked:
+                continue
+            similarity = count / (
+                len(query_trigrams) + self.trigram_sizes[pos] - count)
+            if similarity >= SIMILARITY_THRESHOLD:
+                ranked[pos] = (2, -similarity, len(self.keys[pos]), pos)
+        return ranked
+
+    def ranked_search(self, query, limit=RANKED_SEARCH_LIMIT):
+        """Поиск с учетом опечаток и неверной раскладки клавиатуры."""
+        self.refresh()
+        query = normalize(query)
+        if not query:
+            return []
+        ranked = self.rank(query)
+        swapped = swap_layout(query)
+        if swapped != query:
+            for pos, order in self.rank(swapped).items():
+                if pos not in ranked or order < ranked[pos]:
+                    ranked[pos] = order
+        positions = sorted(ranked, key=ranked.get)[:limit]
+        return [self.entries[pos] for pos in positions]
+
+
+ingredient_index = IngredientIndex()
+
+
+def postgres_ranked_search(query, limit):
+    """Тот же поиск средствами PostgreSQL и индекса pg_trgm."""
+    variants = [query]
+    if swap_layout(query) != query:
+        variants.append(swap_layout(query))
+    matches = Q()
+    for variant in variants:
+        matches |= (Q(name__icontains=variant)
+                    | Q(name__trigram_similar=variant))
+    rank = [When(name__istartswith=variant, then=Value(0))
+            for variant in variants]
+    rank.extend(When(name__icontains=variant, then=Value(1))
+                for variant in variants)
+    similarity = TrigramSimilarity('name', variants[0])
+    for variant in variants[1:]:
+        similarity = Greatest(similarity, TrigramSimilarity('name', variant))
+    return list(
+        Ingredient.objects
+        .filter(matches)
+        .annotate(
+            rank=Case(*rank, default=Value(2), output_field=IntegerField()),
+            similarity=similarity,
+        )
+        .order_by('rank', '-similarity', Length('name'), 'name')
+        .values('id', 'name', 'measurement_unit')[:limit]
+    )
+
+
+def ranked_search(query, limit=RANKED_SEARCH_LIMIT):
+    if connection.vendor == 'postgresql':
+        query = normalize(query)
+        if not query:
+            return []
+        return postgres_ranked_search(query, limit)
+    return ingredient_index.ranked_search(query, limit)
@@ -0,0 +1,138 @@
+from django.conf import settings
+from django.db import transaction
+from django.db.models.signals import (m2m_changed,
+                                      post_delete,
+                                      post_save,
+                                      pre_delete,
+                                      pre_save)
+from django.dispatch import receiver
+
+from .models import (Favorite,
+                     Ingredient,
+                     Recipe,
+                     RecipeIngredient,
+                     ShoppingCart,
+                     ShoppingListItem,
+                     Subscription,
+                     Tag)
+from .counters import change_counter, counted_id
+from .variants import release_image, schedule_variants
+from .versions import bump_version, user_state
+
+
+@receiver(pre_delete, sender=Recipe)
+def remove_recipe_from_shopping_lists(sender, instance, **kwargs):
+    """Убирает ингредиенты удаляемого рецепта из списков покупок."""
+    amounts = ShoppingListItem.objects.recipe_amounts([instance.id])
+    ShoppingListItem.objects.change_recipe(
+        instance, {key: -value for key, value in amounts.items()})
+
+
+@receiver(post_save, sender=Ingredient)
+@receiver(post_delete, sender=Ingredient)
+def change_ingredients_version(sender, **kwargs):
+    bump_version('ingredients')
+
+
+@receiver(post_save, sender=Tag)
+@receiver(post_delete, sender=Tag)
+def change_tags_version(sender, **kwargs):
+    bump_version('tags')
+
+
+@receiver(post_save, sender=Favorite)
+@receiver(post_delete, sender=Favorite)
+@receiver(post_save, sender=ShoppingCart)
+@receiver(post_delete, sender=ShoppingCart)
+@receiver(post_save, sender=Subscription)
+@receiver(post_delete, sender=Subscription)
+def change_user_state_version(sender, instance, **kwargs):
+    bump_version(user_state(instance.user_id))
+
+
+@receiver(post_save, sender=settings.AUTH_USER_MODEL)
+@receiver(post_delete, sender=settings.AUTH_USER_MODEL)
+def change_users_version(sender, created=True, **kwargs):
+    """Число пользователей меняется только при создании и удалении."""
+    if created:
+        bump_version('users')
+
+
+@receiver(post_save, sender=settings.AUTH_USER_MODEL)
+def change_profiles_version(sender, created, update_fields=None, **kwargs):
+    """Данные автора входят в представления рецептов.
+    Вход пользователя меняет только `last_login`, их он не трогает."""
+    if not created and update_fields != frozenset(('last_login',)):
+        bump_version('profiles')
+
+
+@receiver(post_save, sender=Recipe)
+@receiver(post_delete, sender=Recipe)
+@receiver(post_save, sender=RecipeIngredient)
+@receiver(post_delete, sender=RecipeIngredient)
+@receiver(m2m_changed, sender=Recipe.tags.through)
+@receiver(m2m_changed, sender=Recipe.ingredients.through)
+def change_recipes_version(sender, **kwargs):
+    """Новая версия рецептов после фиксации транзакции,
+    чтобы в кэш не попало промежуточное состояние."""
+    transaction.on_commit(lambda: bump_version('recipes'))
+
+
+@receiver(post_save, sender=Favorite)
+@receiver(post_save, sender=Subscription)
+@receiver(post_save, sender=Recipe)
+def increase_counter(sender, instance, created, **kwargs):
+    """Счетчики избранного, подписчиков и рецептов автора."""
+    if created:
+        change_counter(sender, [counted_id(instance)], 1)
+
+
+@receiver(post_delete, sender=Favorite)
+@receiver(post_delete, sender=Subscription)
+@receiver(post_delete, sender=Recipe)
+def decrease_counter(sender, instance, **kwargs):
+    change_counter(sender, [counted_id(instance)], -1)
+
+
+@receiver(post_save, sender=Recipe)
+def move_recipe_counter(sender, instance, created, **kwargs):
+    """Рецепт переходит к другому автору только через админку."""
+    old_author = instance.__dict__.pop('_old_author_id', None)
+    if not created and old_author not in (None, instance.author_id):
+        change_counter(Recipe, [old_author], -1)
+        change_counter(Recipe, [instance.author_id], 1)
+
+
+@receiver(post_save, sender=Recipe)
+def build_image_variants(sender, instance, **kwargs):
+    """Копии новой картинки строятся после фиксации транзакции."""
+    source = instance.image.name
+    if source and instance.image_variants.get('source') != source:
+        transaction.on_commit(
+            lambda: schedule_variants(instance.pk, source))
+
+
+@receiver(pre_save, sender=Recipe)
+def remember_replaced_image(sender, instance, **kwargs):
+    if instance.pk is None:
+        return
+    old = Recipe.objects.filter(pk=instance.pk).values(
+        'image', 'image_variants', 'author_id').first()
+    if old:
+        instance._old_author_id = old['author_id']
+    if old and old['image'] != instance.image.name:
+        instance._replaced_image = (old['image'], old['image_variants'])
+
+
+@receiver(post_save, sender=Recipe)
+def release_replaced_image(sender, instance, **kwargs):
+    replaced = instance.__dict__.pop('_replaced_image', None)
+    if replaced:
+        transaction.on_commit(lambda: release_image(*replaced))
+
+
+@receiver(post_delete, sender=Recipe)
+def release_deleted_image(sender, instance, **kwargs):
+    """Файлы картинки удаляются, когда на них не осталось ссылок."""
+    name, variants = instance.image.name, instance.image_variants
+    transaction.on_commit(lambda: release_image(name, variants))
@@ -0,0 +1,60 @@
+import hashlib
+import posixpath
+import re
+
+from django.core.files.storage import FileSystemStorage
+from django.db import connection
+from django.utils.deconstruct import deconstructible
+
+HASHED_NAME = re.compile(
+    r'(^|/)[0-9a-f]{2}/[0-9a-f]{2}/[0-9a-f]{64}(\.\w+)?$')
+
+
+def lock_file(name):
+    """Блокирует имя файла до конца транзакции. Запись файла
+    и удаление файла без ссылок идут по очереди: иначе рецепт,
+    сохраненный вместе с уже существующим файлом, может сослаться
+    на удаленный в этот момент файл. В SQLite запись и так идет
+    в одном соединении за раз."""
+    if connection.vendor == 'postgresql':
+        with connection.cursor() as cursor:
+            cursor.execute(
+                'SELECT pg_advisory_xact_lock(hashtext(%s))', [name])
+
+
+@deconstructible
+class ContentAddressedStorage(FileSystemStorage):
+    """Хранилище, называющее файлы по SHA-256 содержимого.
+    Файлы раскладываются по подкаталогам из первых символов хэша,
+    одинаковые загрузки хранятся в одном файле. Имя файла никогда
+    не указывает на другое содержимое, поэтому его можно кэшировать
+    без срока годности."""
+
+    def hashed_name(self, name, content):
+        digest = hashlib.sha256()
+        for chunk in content.chunks():
+            digest.update(chunk)
+        content.seek(0)
+        hexdigest = digest.hexdigest()
+        directory, filename = posixpath.split(name)
+        extension = posixpath.splitext(filename)[1].lower()
+        return posixpath.join(
+            directory, hexdigest[:2], hexdigest[2:4], hexdigest + extension)
+
+    def get_available_name(self, name, max_length=None):
+        """Исходное имя заменяется в `_save` и может быть любым.
+        Если файл с тем же хэшем записан параллельно, новое имя
+        не подбирается: содержимое у файлов одинаковое."""
+        if HASHED_NAME.search(name):
+            raise FileExistsError(name)
+        return name
+
+    def _save(self, name, content):
+        name = self.hashed_name(name, content)
+        lock_file(name)
+        if self.exists(name):
+            return name
+        try:
+            return super()._save(name, content)
+        except FileExistsError:
+            return name
@@ -0,0 +1,123 @@
+import logging
+import multiprocessing
+import threading
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from pathlib import PurePosixPath
+
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.db import connection, transaction
+from django.utils import timezone
+
+from .imaging import build_variants
+from .models import Recipe
+from .storage import lock_file
+from .versions import bump_version
+
+VARIANTS_DIR = 'recipes/variants'
+
+logger = logging.getLogger(__name__)
+executors = {}
+executors_lock = threading.Lock()
+
+
+def variants_target(name):
+    """Префикс имен копий картинки `name` в хранилище."""
+    path = PurePosixPath(name)
+    return f'{VARIANTS_DIR}/{path.stem}_{path.suffix.lstrip(".")}'
+
+
+def variant_paths(name):
+    """Пути исходной картинки и копий в файловой системе."""
+    return (default_storage.path(name),
+            default_storage.path(variants_target(name)))
+
+
+def save_variants(recipe_id, source, variants):
+    """Записывает копии в рецепт, если картинка не сменилась
+    за время их построения."""
+    target = variants_target(source)
+    data = {'source': source}
+    for size, files in variants.items():
+        data[size] = {
+            extension: target + suffix
+            for extension, suffix in files.items()
+        }
+    updated = Recipe.objects.filter(pk=recipe_id, image=source).update(
+        image_variants=data, updated_at=timezone.now())
+    if updated:
+        bump_version('recipes')
+    return updated
+
+
+def reuse_variants(recipe_id, source):
+    """Копирует готовые копии у рецепта с той же картинкой."""
+    variants = Recipe.objects.filter(
+        image=source, image_variants__source=source,
+    ).values_list('image_variants', flat=True).first()
+    if variants is None:
+        return False
+    if Recipe.objects.filter(pk=recipe_id, image=source).update(
+            image_variants=variants, updated_at=timezone.now()):
+        bump_version('recipes')
+    return True
+
+
+def release_image(name, variants):
+    """Удаляет файл картинки и ее копий,
+    если на картинку больше не ссылается ни один рецепт.
+    Проверка и удаление идут под блокировкой имени, которую
+    сохранение того же файла держит до фиксации рецепта."""
+    if not name:
+        return
+    with transaction.atomic():
+        lock_file(name)
+        if Recipe.objects.filter(image=name).exists():
+            return
+        storage = Recipe._meta.get_field('image').storage
+        storage.delete(name)
+        if variants.get('source') != name:
+            return
+        for size, files in variants.items():
+            if size != 'source':
+                for file_name in files.values():
+                    storage.delete(file_name)
+
+
+def get_executor(kind):
+    """Общие для процесса пулы: процессы строят копии,
+    потоки ждут результат и записывают его в базу."""
+    with executors_lock:
+        if not executors:
+            workers = settings.IMAGE_VARIANT_WORKERS
+            executors['process'] = ProcessPoolExecutor(
+                max_workers=workers,
+                mp_context=multiprocessing.get_context('spawn'))
+            executors['thread'] = ThreadPoolExecutor(max_workers=workers)
+        return executors[kind]
+
+
+def process_variants(recipe_id, source, in_pool=True):
+    try:
+        if in_pool:
+            variants = get_executor('process').submit(
+                build_variants, *variant_paths(source)).result()
+        else:
+            variants = build_variants(*variant_paths(source))
+        save_variants(recipe_id, source, variants)
+    except Exception:
+        logger.exception('Не удалось построить копии картинки %s', source)
+    finally:
+        if in_pool:
+            connection.close()
+
+
+def schedule_variants(recipe_id, source):
+    """Ставит построение копий картинки рецепта в очередь.
+    При IMAGE_VARIANT_WORKERS = 0 копии строятся сразу."""
+    if reuse_variants(recipe_id, source):
+        return
+    if not settings.IMAGE_VARIANT_WORKERS:
+        process_variants(recipe_id, source, in_pool=False)
+        return
+    get_executor('thread').submit(process_variants, recipe_id, source)
@@ -0,0 +1,32 @@
+import uuid
+
+from django.core.cache import cache
+
+
+def version_key(name):
+    return f'version:{name}'
+
+
+def bump_version(name):
+    """Помечает данные `name` измененными для всех процессов."""
+    cache.set(version_key(name), uuid.uuid4().hex, None)
+
+
+def get_versions(*names):
+    """Текущие версии данных в общем кэше, одним обращением."""
+    keys = [version_key(name) for name in names]
+    versions = cache.get_many(keys)
+    missing = {key: uuid.uuid4().hex for key in keys if key not in versions}
+    if missing:
+        cache.set_many(missing, None)
+        versions.update(missing)
+    return [versions[key] for key in keys]
+
+
+def get_version(name):
+    return get_versions(name)[0]
+
+
+def user_state(user_id):
+    """Имя версии избранного, корзины и подписок пользователя."""
+    return f'user-state:{user_id}'
@@ -1,21 +1,31 @@
 from django.contrib import admin
 
 from recipes import models
+from recipes.admin import BaseAdmin
 
 
 @admin.register(models.User)
-class UserAdmin(admin.ModelAdmin):
+class UserAdmin(BaseAdmin):
     list_display = (
-        'username', 'pk', 'email', 'password', 'first_name', 'last_name',
+        'username', 'pk', 'email', 'first_name', 'last_name',
+        'recipes_count', 'subscribers_count',
     )
-    list_editable = ('password', )
-    list_filter = ('username', 'email')
+    list_filter = ('is_staff', 'is_active')
     search_fields = ('username', 'email')
     empty_value_display = '-пусто-'
 
 
 @admin.register(models.Subscription)
-class SubscribeAdmin(admin.ModelAdmin):
+class SubscribeAdmin(BaseAdmin):
     list_display = ('pk', 'user', 'author')
-    list_editable = ('user', 'author')
+    list_select_related = ('user', 'author')
+    autocomplete_fields = ('user', 'author')
+    search_fields = ('user__username', 'author__username')
     empty_value_display = '-пусто-'
+
+    def get_readonly_fields(self, request, obj=None):
+        """Подписку не переносят на другого автора,
+        иначе разойдется счетчик подписчиков."""
+        if obj is not None:
+            return ('user', 'author')
+        return ()